@@ -12,7 +12,9 @@
     This library supports simple undirected graphs (connected or non-connected).
 
     In this implementation a graph is defined as a dictionary with the node ID as the key. Each key
-    is associated with a list of neighbors, weights, and a payload.
+    is associated with a list of neighbors, weights, and a payload. The dictionary lives in a storage
+    backend: by default an in-memory backend (MemoryStorage), or a disk-backed SQLite backend
+    (SQLiteStorage) for graphs that do not fit in memory.
 
     Important terminology and definitions:
     A node is always referenced by a node ID, which is a string or integer
@@ -28,37 +30,809 @@
 
 """
 
+import array
+import bisect
+import collections
+import contextlib
 import copy
+import functools
+import heapq
+import io
+import itertools
 import json
+import math
+import mmap
+import multiprocessing
+import os
+import random
+import re
+import sqlite3
+import struct
+from xml.sax import saxutils
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:     # Python versions earlier than 3.8
+    resource_tracker = shared_memory = None
+
+try:
+    import numpy
+except ImportError:     # NumPy is optional; centrality methods fall back to loops over the link arrays
+    numpy = None
 
 __author__ = "Edwin Heredia"
 __copyright__ = "Copyright 2019"
 __version__ = "0.1.0"
 
 DEFAULT_INDENT = 4  # Default indent size for saving data using a pretty format
-BASE_NODE_DATA = {'near': set(), 'payload': None}
+BASE_NODE_DATA = {'near': {}, 'payload': None}  # 'near' maps each neighbor with the weight of its link
+INFINITY = float("inf")
+EARTH_RADIUS_KM = 6371.0088  # Mean radius of the Earth used by the haversine distance
+DEFAULT_CACHE_SIZE = 10000  # Default number of adjacency lists kept in memory by disk-backed storage
+INDEX_SUFFIX = ".idx"  # Suffix of the sidecar index files created for lazy loading of json graph files
+INDEX_VERSION = 2  # Version of the sidecar index format
+JSON_TOKENS = re.compile(rb'[{}"\\]')   # Characters that delimit strings and objects in json text
+STR_NODE_LIMIT = 50  # Maximum number of nodes shown when a graph is converted to a string
+DEFAULT_WALK_CHUNK = 1000  # Default number of random walks generated together
+WALK_TASKS_PER_PROCESS = 2  # Chunks of random walks requested ahead from each worker process
+ALIAS_BITS = 24  # Bits of the acceptance probabilities stored in the alias tables of random walks
+ALIAS_MASK = (1 << ALIAS_BITS) - 1  # Extracts the acceptance probability from a packed alias table entry
+ECCENTRICITY_BATCH = 64  # Number of sources explored together (as bits of an integer) to find eccentricities
+MST_PRIM_DENSITY = 0.25  # Link density (links / node pairs) above which Prim's algorithm is used for trees
+JOURNAL_COMPACT_RATIO = 1.0  # Journal records per graph node that trigger a compaction in checkpoint()
+SHARED_MAGIC = b"GRAFLIB1"  # Identifies shared memory blocks that contain a graph
+SHARED_HEADER = struct.Struct("<8sqqqqq")   # magic, nodes, targets, has weights, ids size, payloads size
+NO_TRANSACTION = contextlib.nullcontext()   # Reusable transaction of backends that do not persist data
+
+
+class Storage(object):
+    """ Base class for the storage backends that hold the data of a Graph object.
+
+    A backend maps each node ID to a collection of neighbor tuples of the form (dest_id, weight) and
+    to a payload. The Graph class implements the graph semantics (bi-directional links, default
+    weights, validation of inputs) using only the primitive operations defined here. Subclasses
+    must implement every method that raises NotImplementedError.
+    """
+
+    def size(self):
+        """ Returns the number of stored nodes """
+        raise NotImplementedError
+
+    def node_ids(self):
+        """ Returns an iterable collection with the IDs of all stored nodes """
+        raise NotImplementedError
+
+    def has_node(self, node_id):
+        """ Returns True if the node is stored or False otherwise """
+        raise NotImplementedError
+
+    def add_node(self, node_id):
+        """ Stores a new node with no neighbors and no payload """
+        raise NotImplementedError
+
+    def remove_node(self, node_id):
+        """ Removes a node entry. The links of the node must be removed before calling this method """
+        raise NotImplementedError
+
+    def get_near(self, node_id):
+        """ Returns the (dest_id, weight) tuples of a node as a set-like collection (e.g. the items of a
+        dictionary). The collection must not be modified by the caller.
+        """
+        raise NotImplementedError
+
+    def add_near(self, node_id, near_tuple):
+        """ Adds a (dest_id, weight) tuple to the neighbors of a node. A node has at most one tuple per
+        dest_id, so a tuple replaces the weight of a stored tuple with the same dest_id. Returns the number of
+        tuples that the node gained (0 or 1).
+        """
+        raise NotImplementedError
+
+    def remove_near(self, node_id, near_tuple):
+        """ Removes the tuple with the dest_id of near_tuple from the neighbors of a node. Returns the number
+        of removed tuples (0 or 1)
+        """
+        raise NotImplementedError
+
+    def get_payload(self, node_id):
+        """ Returns the payload of a node (None if there is no payload) """
+        raise NotImplementedError
+
+    def set_payload(self, node_id, payload):
+        """ Sets the payload of a node. A None payload removes the payload """
+        raise NotImplementedError
+
+    def clear(self):
+        """ Removes all nodes, links and payloads """
+        raise NotImplementedError
+
+    def cache_size(self):
+        """ Returns the maximum number of adjacency lists that the backend keeps in memory, which also bounds
+        the data that a Graph caches per node. Backends that keep all data in memory use DEFAULT_CACHE_SIZE.
+        """
+        return DEFAULT_CACHE_SIZE
+
+    def iter_node_data(self):
+        """ Iterates over all nodes in a single pass, yielding tuples (node_id, near, payload) where near is
+        the set of (dest_id, weight) tuples of the node. Backends can override this method with a bulk scan.
+        """
+        for nd in list(self.node_ids()):
+            yield nd, self.get_near(nd), self.get_payload(nd)
+
+    def iter_degrees(self):
+        """ Iterates over all nodes yielding tuples (node_id, degree) with the number of links of each node.
+        Backends can override this method to avoid reading the links.
+        """
+        for nd, near, _ in self.iter_node_data():
+            yield nd, len(near)
+
+    def transaction(self):
+        """ Returns a context manager that groups a sequence of write operations. Backends that persist
+        data write them together. Transactions can be nested; only the outermost transaction has an effect.
+        Backends that keep data in memory return NO_TRANSACTION, which costs almost nothing to enter.
+        """
+        return NO_TRANSACTION
+
+    def close(self):
+        """ Releases any resources held by the backend """
+        pass
+
+
+class MemoryStorage(Storage):
+    """ Default storage backend. Keeps all graph data in a Python dictionary """
+
+    def __init__(self):
+        self.__data = {}     # dictionary object that maps a node with neighbors and payload
+
+    def size(self):
+        return len(self.__data)
+
+    def node_ids(self):
+        return self.__data.keys()
+
+    def has_node(self, node_id):
+        return node_id in self.__data
+
+    def add_node(self, node_id):
+        self.__data[node_id] = copy.deepcopy(BASE_NODE_DATA)
+
+    def remove_node(self, node_id):
+        del self.__data[node_id]
+
+    def get_near(self, node_id):
+        return self.__data[node_id]['near'].items()
+
+    def add_near(self, node_id, near_tuple):
+        near = self.__data[node_id]['near']
+        added = 0 if near_tuple[0] in near else 1
+        near[near_tuple[0]] = near_tuple[1]
+        return added
+
+    def remove_near(self, node_id, near_tuple):
+        near = self.__data[node_id]['near']
+        if near_tuple[0] not in near:
+            return 0
+        del near[near_tuple[0]]
+        return 1
+
+    def get_payload(self, node_id):
+        return self.__data[node_id]['payload']
+
+    def set_payload(self, node_id, payload):
+        self.__data[node_id]['payload'] = payload
+
+    def iter_node_data(self):
+        # Reads the dictionary directly, without a copy of the node IDs (the graph must not change meanwhile)
+        for nd, node_data in self.__data.items():
+            yield nd, node_data['near'].items(), node_data['payload']
+
+    def clear(self):
+        self.__data = {}
+
+
+class SQLiteStorage(Storage):
+    """ Disk-backed storage backend for graphs that do not fit in memory. Nodes, links and payloads
+    are kept in indexed tables of an SQLite database stored in filepath (the default ":memory:" creates
+    a temporary database). Reopening an existing database file gives access to the stored graph.
+
+    Node IDs and payloads are stored as json text, so payloads must be json-serializable (the same
+    requirement imposed by save_json). The adjacency lists of the most recently used nodes are kept in
+    an in-memory LRU cache holding at most cache_size lists. Write operations executed inside a
+    transaction are committed together; outside a transaction every write is committed on its own.
+    """
+
+    def __init__(self, filepath=":memory:", cache_size=DEFAULT_CACHE_SIZE):
+        self.__conn = sqlite3.connect(filepath, isolation_level=None)
+        self.__cache = collections.OrderedDict()   # LRU cache that maps a node with its neighbors and weights
+        self.__cache_size = cache_size
+        self.__depth = 0     # nesting level of open transactions
+
+        self.__conn.execute("PRAGMA journal_mode=WAL")
+        self.__conn.execute("PRAGMA synchronous=NORMAL")
+        self.__conn.execute("CREATE TABLE IF NOT EXISTS nodes (id TEXT PRIMARY KEY, payload TEXT) WITHOUT ROWID")
+        self.__conn.execute("CREATE TABLE IF NOT EXISTS links (src TEXT NOT NULL, dst TEXT NOT NULL, weight, "
+                            "PRIMARY KEY (src, dst)) WITHOUT ROWID")
+
+    @staticmethod
+    def __encode(value):
+        """ (Private method) Converts a node ID or payload into the json text stored in the database """
+        return json.dumps(value, ensure_ascii=False)
+
+    def __remember(self, node_id, near):
+        """ (Private method) Adds an adjacency list (a dictionary that maps each neighbor with its weight)
+        to the LRU cache and evicts the least recently used lists if the cache is full.
+        """
+        self.__cache[node_id] = near
+        while len(self.__cache) > self.__cache_size:
+            self.__cache.popitem(last=False)
+
+    def cached_nodes(self):
+        """ Returns the number of adjacency lists currently held in the LRU cache """
+        return len(self.__cache)
+
+    def cache_size(self):
+        return self.__cache_size
+
+    def size(self):
+        return self.__conn.execute("SELECT COUNT(*) FROM nodes").fetchone()[0]
+
+    def node_ids(self):
+        return _StorageNodeView(self)
+
+    def iter_node_ids(self):
+        """ Iterates over all stored node IDs without loading them in memory at once """
+        for row in self.__conn.execute("SELECT id FROM nodes"):
+            yield json.loads(row[0])
+
+    def has_node(self, node_id):
+        if node_id in self.__cache:
+            return True
+        row = self.__conn.execute("SELECT 1 FROM nodes WHERE id = ?", (self.__encode(node_id),)).fetchone()
+        return row is not None
+
+    def add_node(self, node_id):
+        self.__conn.execute("INSERT INTO nodes (id, payload) VALUES (?, NULL)", (self.__encode(node_id),))
+        self.__remember(node_id, {})
+
+    def remove_node(self, node_id):
+        key = self.__encode(node_id)
+        self.__conn.execute("DELETE FROM links WHERE src = ?", (key,))
+        self.__conn.execute("DELETE FROM nodes WHERE id = ?", (key,))
+        self.__cache.pop(node_id, None)
+
+    def get_near(self, node_id):
+        if node_id in self.__cache:
+            self.__cache.move_to_end(node_id)
+            return self.__cache[node_id].items()
+
+        rows = self.__conn.execute("SELECT dst, weight FROM links WHERE src = ?", (self.__encode(node_id),))
+        near = {json.loads(dst): weight for dst, weight in rows}
+        self.__remember(node_id, near)
+        return near.items()
+
+    def add_near(self, node_id, near_tuple):
+        # A link to an already linked node replaces its weight, so the node does not gain a tuple
+        key, dest_key = self.__encode(node_id), self.__encode(near_tuple[0])
+        cursor = self.__conn.execute("UPDATE links SET weight = ? WHERE src = ? AND dst = ?",
+                                     (near_tuple[1], key, dest_key))
+        added = 0 if cursor.rowcount > 0 else 1
+        if added:
+            self.__conn.execute("INSERT INTO links (src, dst, weight) VALUES (?, ?, ?)",
+                                (key, dest_key, near_tuple[1]))
+        if node_id in self.__cache:
+            self.__cache[node_id][near_tuple[0]] = near_tuple[1]
+        return added
+
+    def remove_near(self, node_id, near_tuple):
+        cursor = self.__conn.execute("DELETE FROM links WHERE src = ? AND dst = ?",
+                                     (self.__encode(node_id), self.__encode(near_tuple[0])))
+        if node_id in self.__cache:
+            self.__cache[node_id].pop(near_tuple[0], None)
+        return cursor.rowcount
+
+    def get_payload(self, node_id):
+        row = self.__conn.execute("SELECT payload FROM nodes WHERE id = ?", (self.__encode(node_id),)).fetchone()
+        return None if row is None or row[0] is None else json.loads(row[0])
+
+    def set_payload(self, node_id, payload):
+        value = None if payload is None else self.__encode(payload)
+        self.__conn.execute("UPDATE nodes SET payload = ? WHERE id = ?", (value, self.__encode(node_id)))
+
+    def iter_node_data(self):
+        # A single ordered scan of both tables, which avoids one query per node
+        rows = self.__conn.execute("SELECT nodes.id, nodes.payload, links.dst, links.weight FROM nodes "
+                                   "LEFT JOIN links ON links.src = nodes.id ORDER BY nodes.id")
+        current_key, near, payload = None, None, None
+        for key, pload, dst, weight in rows:
+            if key != current_key:
+                if current_key is not None:
+                    yield json.loads(current_key), near, payload
+                current_key, near = key, set()
+                payload = None if pload is None else json.loads(pload)
+            if dst is not None:
+                near.add((json.loads(dst), weight))
+        if current_key is not None:
+            yield json.loads(current_key), near, payload
+
+    def iter_degrees(self):
+        rows = self.__conn.execute("SELECT nodes.id, COUNT(links.dst) FROM nodes "
+                                   "LEFT JOIN links ON links.src = nodes.id GROUP BY nodes.id")
+        for key, degree in rows:
+            yield json.loads(key), degree
+
+    def clear(self):
+        with self.transaction():
+            self.__conn.execute("DELETE FROM links")
+            self.__conn.execute("DELETE FROM nodes")
+        self.__cache.clear()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        if self.__depth == 0:
+            self.__conn.execute("BEGIN")
+        self.__depth += 1
+        try:
+            yield
+        except BaseException:
+            self.__depth -= 1
+            if self.__depth == 0:
+                self.__conn.execute("ROLLBACK")
+                self.__cache.clear()    # cached lists may contain rolled back changes
+            raise
+        else:
+            self.__depth -= 1
+            if self.__depth == 0:
+                self.__conn.execute("COMMIT")
+
+    def close(self):
+        self.__cache.clear()
+        self.__conn.close()
+
+
+class _StorageNodeView(object):
+    """ Read-only view of the node IDs stored by a backend that does not keep them in a dictionary
+    (SQLiteStorage, LazyJSONStorage). Supports len(), membership tests and iteration.
+    """
+
+    def __init__(self, storage):
+        self.__storage = storage
+
+    def __len__(self):
+        return self.__storage.size()
+
+    def __contains__(self, node_id):
+        return self.__storage.has_node(node_id)
+
+    def __iter__(self):
+        return self.__storage.iter_node_ids()
+
+
+class LazyJSONStorage(Storage):
+    """ Storage backend that reads a graph saved by save_json on demand. Node records are located
+    through a byte-offset index, and a node (its neighbors and payload) is materialized only when it is
+    first used. At most cache_size unmodified nodes are kept in memory (least recently used nodes are
+    dropped first).
+
+    The index is built the first time a file is opened and saved next to it in a sidecar file (the file
+    path followed by INDEX_SUFFIX). The sidecar is rebuilt whenever the graph file changes. Changes made
+    to the graph are kept in memory and never written back to the graph file; use save_json to store them.
+    """
+
+    def __init__(self, filepath, cache_size=DEFAULT_CACHE_SIZE):
+        self.__file = open(filepath, "rb")
+        self.__map = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.__index = self.__read_index(filepath)     # maps node IDs to (start, end, degree) of their records
+        self.__cache = collections.OrderedDict()        # LRU cache of materialized, unmodified nodes
+        self.__cache_size = cache_size
+        self.__changed = {}         # nodes added or modified since loading (never evicted)
+        self.__removed = set()      # indexed nodes whose file record is no longer valid
+
+    def __read_index(self, filepath):
+        """ (Private method) Reads the sidecar index of a graph file, or builds it if it does not exist
+        or if it does not match the graph file.
+        """
+        index_path = filepath + INDEX_SUFFIX
+        stats = os.stat(filepath)
+        if os.path.exists(index_path):
+            with open(index_path, "r") as jf:
+                saved = json.load(jf)
+            if saved.get('version') == INDEX_VERSION and saved['size'] == stats.st_size and \
+                    saved['mtime'] == stats.st_mtime_ns:
+                return {elem[0]: tuple(elem[1:]) for elem in saved['nodes']}
+
+        entries = [list(entry) for entry in _index_json_records(self.__map)]
+        with open(index_path, "w") as jf:
+            json.dump({'version': INDEX_VERSION, 'size': stats.st_size, 'mtime': stats.st_mtime_ns,
+                       'nodes': entries}, jf, ensure_ascii=False)
+        return {elem[0]: tuple(elem[1:]) for elem in entries}
+
+    def __node_data(self, node_id, for_update=False):
+        """ (Private method) Returns the materialized data of a node (a dictionary with 'near' and
+        'payload' keys). Nodes that are going to be modified (for_update is True) are moved out of
+        the cache so that their changes are never evicted.
+        """
+        if node_id in self.__changed:
+            return self.__changed[node_id]
+
+        if node_id in self.__cache:
+            if for_update:
+                node_data = self.__cache.pop(node_id)
+            else:
+                self.__cache.move_to_end(node_id)
+                node_data = self.__cache[node_id]
+        else:
+            start, end, _ = self.__index[node_id]
+            record = json.loads(self.__map[start:end])
+            node_data = {'near': {elem[0]: elem[1] for elem in record['neighbors']}, 'payload': record['payload']}
+            if not for_update:
+                self.__cache[node_id] = node_data
+                while len(self.__cache) > self.__cache_size:
+                    self.__cache.popitem(last=False)
+
+        if for_update:
+            self.__changed[node_id] = node_data
+        return node_data
+
+    def cached_nodes(self):
+        """ Returns the number of nodes currently materialized in memory """
+        return len(self.__cache) + len(self.__changed)
+
+    def cache_size(self):
+        return self.__cache_size
+
+    def size(self):
+        added = sum(1 for nd in self.__changed if nd not in self.__index or nd in self.__removed)
+        return len(self.__index) - len(self.__removed) + added
+
+    def node_ids(self):
+        return _StorageNodeView(self)
+
+    def iter_node_ids(self):
+        """ Iterates over all node IDs without materializing any node """
+        for nd in self.__index:
+            if nd not in self.__removed or nd in self.__changed:
+                yield nd
+        for nd in self.__changed:
+            if nd not in self.__index:
+                yield nd
+
+    def has_node(self, node_id):
+        return node_id in self.__changed or (node_id in self.__index and node_id not in self.__removed)
+
+    def add_node(self, node_id):
+        self.__changed[node_id] = copy.deepcopy(BASE_NODE_DATA)
+
+    def remove_node(self, node_id):
+        self.__changed.pop(node_id, None)
+        self.__cache.pop(node_id, None)
+        if node_id in self.__index:
+            self.__removed.add(node_id)
+
+    def get_near(self, node_id):
+        return self.__node_data(node_id)['near'].items()
+
+    def add_near(self, node_id, near_tuple):
+        near = self.__node_data(node_id, for_update=True)['near']
+        added = 0 if near_tuple[0] in near else 1
+        near[near_tuple[0]] = near_tuple[1]
+        return added
+
+    def remove_near(self, node_id, near_tuple):
+        near = self.__node_data(node_id, for_update=True)['near']
+        if near_tuple[0] not in near:
+            return 0
+        del near[near_tuple[0]]
+        return 1
+
+    def get_payload(self, node_id):
+        return self.__node_data(node_id)['payload']
+
+    def set_payload(self, node_id, payload):
+        self.__node_data(node_id, for_update=True)['payload'] = payload
+
+    def iter_degrees(self):
+        # Degrees of unchanged nodes are stored in the index, so no node is materialized
+        for nd in self.iter_node_ids():
+            if nd in self.__changed:
+                yield nd, len(self.__changed[nd]['near'])
+            else:
+                yield nd, self.__index[nd][2]
+
+    def clear(self):
+        self.__index = {}
+        self.__cache.clear()
+        self.__changed = {}
+        self.__removed = set()
+
+    def close(self):
+        self.__cache.clear()
+        self.__map.close()
+        self.__file.close()
+
+
+def _index_json_records(buffer):
+    """ Scans a graph file saved by save_json (given as a bytes-like buffer, e.g. an mmap) and yields a
+    tuple (node_id, start, end, degree) with the byte offsets of the json record of each node and its
+    number of links. Only one record is decoded at a time.
+    """
+    depth = 0
+    in_string = False
+    skip = -1           # position of a character escaped by a backslash
+    key_start = None
+    key = None
+    value_start = None
+
+    for match in JSON_TOKENS.finditer(buffer):
+        pos = match.start()
+        if pos == skip:
+            continue
+        char = match.group()
+
+        if in_string:
+            if char == b'\\':
+                skip = pos + 1
+            elif char == b'"':
+                in_string = False
+                if key_start is not None:
+                    key = json.loads(buffer[key_start:pos + 1])
+                    key_start = None
+        elif char == b'"':
+            in_string = True
+            if depth == 1:
+                key_start = pos
+        elif char == b'{':
+            depth += 1
+            if depth == 2:
+                value_start = pos
+        elif char == b'}':
+            depth -= 1
+            if depth == 1:
+                record = json.loads(buffer[value_start:pos + 1])
+                yield record.get('id', key), value_start, pos + 1, len(record['neighbors'])
 
 
 class Graph(object):
-    def __init__(self, has_weights=False):
+    def __init__(self, has_weights=False, storage=None):
+        """ Creates a graph with or without weights. The graph data is kept by a storage backend
+        (storage). If no backend is given the data is kept in memory by a MemoryStorage object.
+        """
         # Define private variables
         self.__has_weights = has_weights
-        self.__data = {}     # dictionary object that maps a node with neighbors and payload
+        # backend that maps nodes with neighbors and payload
+        self.__store = MemoryStorage() if storage is None else storage
+        self.__journal = None            # file object of the change journal (None if journaling is off)
+        self.__journal_path = None
+        self.__snapshot_path = None
+        self.__journal_records = 0       # number of records written to the journal since the last compaction
+        self.__degrees = None            # degree index that maps nodes with their number of links (built on use)
+        self.__degree_buckets = {}       # maps each degree value with the set of nodes that have it
+        self.__degree_values = []        # sorted list of the degree values in use
+        self.__sorted_links = collections.OrderedDict()  # LRU cache of links sorted by weight
+        self.__payload_indexes = {}      # secondary indexes over payloads, by name
 
     def size(self):
         """ Provides the number of nodes in the graph """
-        return len(self.__data)
+        return self.__store.size()
 
     def get_nodes(self):
         """ Returns the list of all nodes (identified by their IDs) in the graph
         """
-        return self.__data.keys()
+        return self.__store.node_ids()
+
+    def batch(self):
+        """ Returns a context manager that groups graph updates into a single storage transaction.
+        Updates made inside a 'with graph.batch():' block are written together by disk-backed storage.
+        """
+        return self.__store.transaction()
+
+    def close(self):
+        """ Releases the resources held by the storage backend (e.g. a database connection) """
+        self.__store.close()
+
+    def has_weights(self):
+        """ Returns True if the graph has been defined as having weights """
+        return self.__has_weights
+
+    def storage(self):
+        """ Returns the storage backend that holds the graph data """
+        return self.__store
+
+    def degree(self, node_id):
+        """ Returns the number of links of a node identified by its ID, or None if the node does not exist.
+        The value is read from a degree index that is built from the storage backend when it is first
+        needed and then kept up to date by every change to the graph.
+        """
+        self.__build_degree_index()
+        return self.__degrees.get(node_id)
+
+    def degree_histogram(self):
+        """ Returns a list with the number of nodes of each degree: the element at position d is the
+        number of nodes with d links.
+        """
+        self.__build_degree_index()
+        if len(self.__degree_values) == 0:
+            return []
+        histogram = [0] * (self.__degree_values[-1] + 1)
+        for value in self.__degree_values:
+            histogram[value] = len(self.__degree_buckets[value])
+        return histogram
+
+    def top_k_by_degree(self, k):
+        """ Returns a list of (node_id, degree) tuples with the k nodes that have the most links, sorted by
+        decreasing degree. Nodes with the same degree are listed in arbitrary order.
+        """
+        self.__build_degree_index()
+        response = []
+        for value in reversed(self.__degree_values):
+            for nd in self.__degree_buckets[value]:
+                if len(response) == k:
+                    return response
+                response.append((nd, value))
+        return response
+
+    def nodes_with_degree_between(self, low, high):
+        """ Returns the list of nodes that have at least low and at most high links """
+        self.__build_degree_index()
+        start = bisect.bisect_left(self.__degree_values, low)
+        end = bisect.bisect_right(self.__degree_values, high)
+        response = []
+        for value in self.__degree_values[start:end]:
+            response.extend(self.__degree_buckets[value])
+        return response
+
+    def create_payload_index(self, field=None, key=None, kind="hash", name=None):
+        """ Creates a secondary index over node payloads so that nodes can be found by payload values
+        without scanning the graph. The indexed value is the payload entry named field (e.g. a dictionary
+        key) or the value returned by the key function. The index is built once from the current payloads
+        and then kept up to date by every change to payloads and nodes.
+            kind: "hash" for equality lookups or "sorted" for equality and range lookups
+            name: Name used to query the index. Defaults to field (required for indexes with a key function)
+        Returns the number of indexed nodes.
+        """
+        if kind == "hash":
+            index = _HashPayloadIndex(field, key)
+        elif kind == "sorted":
+            index = _SortedPayloadIndex(field, key)
+        else:
+            raise ValueError("Unknown payload index kind: {}".format(kind))
+
+        name = field if name is None else name
+        self.__payload_indexes[name] = index
+
+        return index.build((nd, payload) for nd, _, payload in self.__store.iter_node_data())
+
+    def drop_payload_index(self, name):
+        """ Removes a payload index. Returns the number of removed indexes (0 or 1) """
+        return 0 if self.__payload_indexes.pop(name, None) is None else 1
+
+    def find_nodes(self, **conditions):
+        """ Returns the set of nodes whose payloads match all the conditions, given as name=value pairs,
+        e.g. find_nodes(first='bob'). Each name refers to a payload index; names without an index are
+        checked by scanning the payloads (as payload[name]), which is much slower.
+        """
+        response = None
+        for name, value in conditions.items():
+            index = self.__payload_indexes.get(name)
+            if index is not None:
+                matches = index.find(value)
+            else:
+                matches = set(nd for nd, _, payload in self.__store.iter_node_data()
+                              if _PayloadIndex(name).value_of(payload) == value)
+            response = matches if response is None else response & matches
+            if len(response) == 0:
+                break
+        return set() if response is None else response
+
+    def find_nodes_in_range(self, name, low=None, high=None):
+        """ Returns the set of nodes whose indexed payload value v satisfies low <= v <= high, using a
+        payload index of kind "sorted". A bound that is None is not applied. Returns None if there is no
+        sorted index with the given name.
+        """
+        index = self.__payload_indexes.get(name)
+        if not isinstance(index, _SortedPayloadIndex):
+            return None
+        return index.find_range(low, high)
+
+    def __index_payload(self, node_id, old_payload, new_payload):
+        """ (Private method) Updates the payload indexes after the payload of a node changes """
+        for index in self.__payload_indexes.values():
+            index.remove(node_id, old_payload)
+            index.add(node_id, new_payload)
+
+    def __rebuild_payload_indexes(self):
+        """ (Private method) Builds all payload indexes again from the stored payloads """
+        for index in self.__payload_indexes.values():
+            index.build((nd, payload) for nd, _, payload in self.__store.iter_node_data())
+
+    def __set_degree(self, node_id, value):
+        """ (Private method) Updates the degree index with the degree of a node (None for removed nodes) """
+        if value is None:
+            self.__sorted_links.pop(node_id, None)
+        if self.__degrees is None:
+            return
+
+        old_value = self.__degrees.get(node_id)
+        if old_value == value:
+            return
+
+        if old_value is not None:
+            bucket = self.__degree_buckets[old_value]
+            bucket.discard(node_id)
+            if len(bucket) == 0:
+                del self.__degree_buckets[old_value]
+                del self.__degree_values[bisect.bisect_left(self.__degree_values, old_value)]
+
+        if value is None:
+            del self.__degrees[node_id]
+        else:
+            self.__degrees[node_id] = value
+            if value not in self.__degree_buckets:
+                self.__degree_buckets[value] = set()
+                bisect.insort(self.__degree_values, value)
+            self.__degree_buckets[value].add(node_id)
+
+    def __change_degree(self, node_id, delta):
+        """ (Private method) Adds delta (the number of neighbor tuples gained or lost by a node, as reported
+        by the storage backend) to the degree of a node, and drops its links sorted by weight.
+        """
+        self.__sorted_links.pop(node_id, None)
+        if self.__degrees is not None and delta != 0:
+            self.__set_degree(node_id, self.__degrees[node_id] + delta)
+
+    def __reset_degree_index(self):
+        """ (Private method) Drops the degree index (it is built again when first needed) and the links
+        sorted by weight, after the data of the graph has been replaced.
+        """
+        self.__sorted_links.clear()
+        self.__degrees = None
+
+    def __build_degree_index(self):
+        """ (Private method) Builds the degree index from the storage backend in a single pass, unless it
+        already exists.
+        """
+        if self.__degrees is not None:
+            return
+        self.__degrees = dict(self.__store.iter_degrees())
+        self.__degree_buckets = {}
+        for nd, value in self.__degrees.items():
+            self.__degree_buckets.setdefault(value, set()).add(nd)
+        self.__degree_values = sorted(self.__degree_buckets.keys())
+
+    def iter_node_data(self):
+        """ Iterates over all nodes in a single bulk pass over the storage backend. Yields tuples of the form
+        (node_id, near, payload) where near is a set of (next_id, weight) tuples (the weight is None in graphs
+        without weights). The sets must not be modified, and the graph must not change during the iteration.
+        """
+        return self.__store.iter_node_data()
+
+    def iter_links(self):
+        """ Iterates over all links of the graph, reporting each link once. Links have the same format as
+        in get_links(): (node_id, next_id) or (node_id, next_id, weight) for graphs with weights.
+        """
+        for nd, near, _ in self.__store.iter_node_data():
+            for link in self.__own_links(nd, near):
+                yield link
+
+    def __own_links(self, node_id, near):
+        """ (Private method) Returns the links of a node (in the format of get_links()) that are reported
+        from this node. Each link is reported from the end with the lowest (type name, ID) key, so links can
+        be listed once in a single pass without remembering the visited nodes.
+        """
+        key = _node_order_key(node_id)
+        if self.__has_weights:
+            return [(node_id, elem[0], elem[1]) for elem in near if key <= _node_order_key(elem[0])]
+        return [(node_id, elem[0]) for elem in near if key <= _node_order_key(elem[0])]
+
+    def freeze(self):
+        """ Returns a read-only, array-backed copy of the graph (a FrozenGraph object). The copy does
+        not reflect later changes to the graph.
+        """
+        return FrozenGraph.from_graph(self)
 
     def node_exists(self, node_id):
         """ Verifies if a node identified by an ID (integer or string) already exists in the graph.
         Returns True if node exists or False otherwise.
         """
-        if node_id in self.__data.keys():
+        if self.__store.has_node(node_id):
             return True
         else:
             return False
@@ -86,8 +860,8 @@ class Graph(object):
         Returns False if they are not neighbors or if any of the nodes does not exist.
         """
         if self.node_exists(init_id) and self.node_exists(dest_id):
-            nbors1 = [elem[0] for elem in self.__data[init_id]['near']]
-            nbors2 = [elem[0] for elem in self.__data[dest_id]['near']]
+            nbors1 = [elem[0] for elem in self.__store.get_near(init_id)]
+            nbors2 = [elem[0] for elem in self.__store.get_near(dest_id)]
 
             if dest_id in nbors1 and init_id in nbors2:
                 return True
@@ -110,7 +884,7 @@ class Graph(object):
         if self.node_does_not_exist(node_id):
             return None
         else:
-            graph_links = self.__data[node_id]['near']
+            graph_links = self.__store.get_near(node_id)
             if self.__has_weights:
                 return [(node_id, elem[0], elem[1]) for elem in graph_links]
             else:
@@ -125,12 +899,57 @@ class Graph(object):
         else:
             return None
 
+    def top_k_neighbors(self, node_id, k):
+        """ Returns the k links of a node with the highest weights, strongest first, in the format of
+        get_links(). Returns None if the node does not exist. Links of graphs without weights count as
+        having the same weight. The links of a node are sorted by weight when first needed and kept until
+        the node changes, so repeated queries take time proportional to k.
+        """
+        if self.node_does_not_exist(node_id):
+            return None
+        weights, near = self.__weight_sorted_links(node_id)
+        last = len(near) - 1
+        return [self.__as_link(node_id, near[pos], weights[pos]) for pos in range(last, max(last - k, -1), -1)]
+
+    def neighbors_with_weight_between(self, node_id, low, high):
+        """ Returns the links of a node whose weights are between low and high (inclusive), in increasing
+        order of weight and in the format of get_links(). Returns None if the node does not exist. Links of
+        graphs without weights have a weight of 1.0. See top_k_neighbors() about the sorted links.
+        """
+        if self.node_does_not_exist(node_id):
+            return None
+        weights, near = self.__weight_sorted_links(node_id)
+        start, end = bisect.bisect_left(weights, low), bisect.bisect_right(weights, high)
+        return [self.__as_link(node_id, near[pos], weights[pos]) for pos in range(start, end)]
+
+    def __weight_sorted_links(self, node_id):
+        """ (Private method) Returns the weights of the links of a node in increasing order and the list of
+        neighbors in the same order. The lists are built on first use and dropped when the node changes. They
+        are kept in an LRU cache with as many entries as the cache of the storage backend (at least one).
+        """
+        if node_id in self.__sorted_links:
+            self.__sorted_links.move_to_end(node_id)
+            return self.__sorted_links[node_id]
+
+        near = sorted(self.__store.get_near(node_id), key=lambda elem: 1.0 if elem[1] is None else elem[1])
+        entry = ([1.0 if elem[1] is None else elem[1] for elem in near], [elem[0] for elem in near])
+        self.__sorted_links[node_id] = entry
+        while len(self.__sorted_links) > max(1, self.__store.cache_size()):
+            self.__sorted_links.popitem(last=False)
+        return entry
+
+    def __as_link(self, node_id, next_id, weight):
+        """ (Private method) Formats a link as in get_links() """
+        return (node_id, next_id, weight) if self.__has_weights else (node_id, next_id)
+
     def add_node(self, node_id):
         """ Adds a node (identified by its string or integer ID) to the graph without any links.
         Returns the number of added nodes (zero or one).
         """
         if self.node_does_not_exist(node_id):
-            self.__data[node_id] = copy.deepcopy(BASE_NODE_DATA)
+            self.__store.add_node(node_id)
+            self.__set_degree(node_id, 0)
+            self.__log("an", node_id)
             return 1
         else:
             return 0
@@ -141,9 +960,10 @@ class Graph(object):
         IDs that alreay exist or duplicates, they are ignored.
         """
         added_nodes = 0
-        for nd in node_list:
-            result = self.add_node(nd)
-            added_nodes += result
+        with self.__store.transaction():
+            for nd in node_list:
+                result = self.add_node(nd)
+                added_nodes += result
         return added_nodes
 
     def __get_reference_tuple(self, init_id, dest_id):
@@ -152,7 +972,7 @@ class Graph(object):
         the weight value is set to None. If the link does not exist this method returns None.
         """
         if self.are_neighbors(init_id, dest_id):
-            all_tuples = self.__data[init_id]['near']
+            all_tuples = self.__store.get_near(init_id)
             for tuple in all_tuples:
                 if tuple[0] == dest_id:
                     return tuple
@@ -171,8 +991,12 @@ class Graph(object):
             if tuple_forward is None or tuple_backward is None:
                 return 0
             else:
-                self.__data[init_id]['near'].remove(tuple_forward)
-                self.__data[dest_id]['near'].remove(tuple_backward)
+                with self.__store.transaction():
+                    removed_forward = self.__store.remove_near(init_id, tuple_forward)
+                    removed_backward = self.__store.remove_near(dest_id, tuple_backward)
+                self.__change_degree(init_id, -removed_forward)
+                self.__change_degree(dest_id, -removed_backward)
+                self.__log("rl", init_id, dest_id)
                 return 1
         else:
             return 0
@@ -183,16 +1007,22 @@ class Graph(object):
         """
         if self.node_exists(node_id):
             # Get all neighbor nodes
-            nbors = copy.deepcopy(self.__data[node_id]['near'])
-            nbors = [nbor[0] for nbor in nbors]
+            nbors = [nbor[0] for nbor in self.__store.get_near(node_id)]
+
+            # Remove the node from the payload indexes
+            if self.__payload_indexes:
+                self.__index_payload(node_id, self.__store.get_payload(node_id), None)
 
-            # Remove links between the selected nodes and its neighbors
-            for nb in nbors:
-                self.remove_link_between_nodes(node_id, nb)
+            with self.__store.transaction():
+                # Remove links between the selected nodes and its neighbors
+                for nb in nbors:
+                    self.remove_link_between_nodes(node_id, nb)
 
-            # Remove the node entry from the graph
-            del self.__data[node_id]
+                # Remove the node entry from the graph
+                self.__store.remove_node(node_id)
 
+            self.__set_degree(node_id, None)
+            self.__log("rn", node_id)
             return 1
         else:
             return 0
@@ -202,9 +1032,10 @@ class Graph(object):
         Returns the number of removed nodes.
         """
         count = 0
-        for nd in node_list:
-            res = self.remove_node(nd)
-            count += res
+        with self.__store.transaction():
+            for nd in node_list:
+                res = self.remove_node(nd)
+                count += res
         return count
 
     def add_link(self, init_id, dest_id, weight=None):
@@ -214,6 +1045,8 @@ class Graph(object):
         If the graph has not been defined as having weights:
            The weight value is ignored
 
+        Two nodes have at most one link, so linking two neighbors again replaces the weight of their link.
+
         Returns number of added links. It can be 0 if any of the two nodes does not exist.
         """
         if self.node_exists(init_id) and self.node_exists(dest_id):
@@ -224,8 +1057,12 @@ class Graph(object):
                 tuple_forward = (dest_id, None)
                 tuple_backward = (init_id, None)
 
-            self.__data[init_id]['near'].add(tuple_forward)
-            self.__data[dest_id]['near'].add(tuple_backward)
+            with self.__store.transaction():
+                added_forward = self.__store.add_near(init_id, tuple_forward)
+                added_backward = self.__store.add_near(dest_id, tuple_backward)
+            self.__change_degree(init_id, added_forward)
+            self.__change_degree(dest_id, added_backward)
+            self.__log("al", init_id, dest_id, tuple_forward[1])
             return 1
         else:
             return 0
@@ -243,19 +1080,20 @@ class Graph(object):
         Returns the number of links added.
         """
 
-        if self.__has_weights:
-            count = 0
-            for edge in link_list:
-                e0, e1 = edge[0], edge[1]
-                result = self.add_link(e0, e1, 1.0) if len(edge) == 2 else self.add_link(e0, e1, edge[2])
-                count += result
-            return count
-        else:
-            count = 0
-            for edge in link_list:
-                result = self.add_link(edge[0], edge[1])
-                count += result
-            return count
+        with self.__store.transaction():
+            if self.__has_weights:
+                count = 0
+                for edge in link_list:
+                    e0, e1 = edge[0], edge[1]
+                    result = self.add_link(e0, e1, 1.0) if len(edge) == 2 else self.add_link(e0, e1, edge[2])
+                    count += result
+                return count
+            else:
+                count = 0
+                for edge in link_list:
+                    result = self.add_link(edge[0], edge[1])
+                    count += result
+                return count
 
     def remove_links_from_list_of_neighbors(self, neighbors_list):
         """ Removes links defined by a list of neighbors. Each element in the list is a tuple of the
@@ -263,16 +1101,17 @@ class Graph(object):
         actually neighbors. Returns the number of removed links.
         """
         count = 0
-        for nbor_tuple in neighbors_list:
-            result = self.remove_link_between_nodes(nbor_tuple[0], nbor_tuple[1])
-            count += result
+        with self.__store.transaction():
+            for nbor_tuple in neighbors_list:
+                result = self.remove_link_between_nodes(nbor_tuple[0], nbor_tuple[1])
+                count += result
         return count
 
     def get_payload(self, node_id):
         """ Retrieves and returns the payload from a node identified by its ID (string or integer).
         Returns None if node does not exist or if node does not have any payload.
         """
-        return None if self.node_does_not_exist(node_id) else self.__data[node_id]["payload"]
+        return None if self.node_does_not_exist(node_id) else self.__store.get_payload(node_id)
 
     def retrieve_node_data(self, node_id):
         """ Retrieves neighbors and payload for a node identified by its ID (string or integer).
@@ -290,7 +1129,10 @@ class Graph(object):
         if self.node_does_not_exist(node_id) or payload is None:
             return 0
         else:
-            self.__data[node_id]['payload'] = payload
+            if self.__payload_indexes:
+                self.__index_payload(node_id, self.__store.get_payload(node_id), payload)
+            self.__store.set_payload(node_id, payload)
+            self.__log("ap", node_id, payload)
             return 1
 
     def add_payloads_from_list(self, payload_list):
@@ -299,9 +1141,10 @@ class Graph(object):
             Returns the number of successful additions
         """
         count = 0
-        for elem in payload_list:
-            res = self.add_payload(elem[0], elem[1])
-            count += res
+        with self.__store.transaction():
+            for elem in payload_list:
+                res = self.add_payload(elem[0], elem[1])
+                count += res
         return count
 
     def remove_payload(self, node_id):
@@ -311,7 +1154,10 @@ class Graph(object):
         if self.node_does_not_exist(node_id):
             return 0
         else:
-            self.__data[node_id]['payload'] = None
+            if self.__payload_indexes:
+                self.__index_payload(node_id, self.__store.get_payload(node_id), None)
+            self.__store.set_payload(node_id, None)
+            self.__log("rp", node_id)
             return 1
 
     def remove_payloads_from_list(self, payload_list):
@@ -319,9 +1165,10 @@ class Graph(object):
         A payload is not removed if the node does not exist.
         """
         count = 0
-        for nd in payload_list:
-            res = self.remove_payload(nd)
-            count += res
+        with self.__store.transaction():
+            for nd in payload_list:
+                res = self.remove_payload(nd)
+                count += res
         return count
 
     def has_payload(self, node_id):
@@ -331,113 +1178,164 @@ class Graph(object):
         if self.node_does_not_exist(node_id):
             return False
         else:
-            return False if self.__data[node_id]['payload'] is None else True
+            return False if self.__store.get_payload(node_id) is None else True
 
     def __str__(self):
-        """ Returns a string displaying graph information for use in print statements.
+        """ Returns a string displaying graph information for use in print statements. Graphs with more
+        than STR_NODE_LIMIT nodes are summarized: the string shows the numbers of nodes and links and only
+        the first STR_NODE_LIMIT nodes (use write_text() to write all of them to a file).
+        """
+        text_mode = io.StringIO()
+        if self.size() > STR_NODE_LIMIT:
+            num_links = sum(value for _, value in self.__store.iter_degrees()) // 2
+            text_mode.write("Graph with {} nodes and {} links{}\n".format(
+                self.size(), num_links, " (with weights)" if self.__has_weights else ""))
+            self.write_text(text_mode, limit=STR_NODE_LIMIT)
+            text_mode.write("... {} more nodes\n".format(self.size() - STR_NODE_LIMIT))
+        else:
+            self.write_text(text_mode)
+        return text_mode.getvalue()
+
+    def write_text(self, stream, start=0, limit=None):
+        """ Writes a readable line per node (in the format of print statements) to a file-like object,
+        one node at a time. start and limit select a page of nodes: the nodes from position start (in the
+        order of get_nodes()) up to a maximum of limit nodes (all the remaining nodes if limit is None).
+        Returns the number of written nodes.
         """
-        text_mode = ""
-        nodes = self.get_nodes()
-        for nd in nodes:
-            links = self.get_links(nd)
-            pload = self.get_payload(nd)
-            text_mode += "node: {},  near: {},  payload: {}\n".format(nd, links, pload)
+        stop = None if limit is None else start + limit
+        count = 0
+        for nd, near, pload in itertools.islice(self.__store.iter_node_data(), start, stop):
+            if self.__has_weights:
+                links = [(nd, elem[0], elem[1]) for elem in near]
+            else:
+                links = [(nd, elem[0]) for elem in near]
+            stream.write("node: {},  near: {},  payload: {}\n".format(nd, links, pload))
+            count += 1
+        return count
 
-        return text_mode
+    def write_dot(self, stream, name="G"):
+        """ Writes the graph in the DOT language of Graphviz to a file-like object in a single pass over the
+        nodes, writing each node followed by its links. Node IDs are written as quoted strings, and link
+        weights as a 'weight' attribute. Extra memory does not depend on the size of the graph.
+        """
+        stream.write("graph {} {{\n".format(json.dumps(str(name))))
+        for nd, near, _ in self.__store.iter_node_data():
+            stream.write("    {};\n".format(json.dumps(str(nd), ensure_ascii=False)))
+            for link in self.__own_links(nd, near):
+                stream.write("    {} -- {}".format(json.dumps(str(link[0]), ensure_ascii=False),
+                                                  json.dumps(str(link[1]), ensure_ascii=False)))
+                stream.write(" [weight={}];\n".format(link[2]) if self.__has_weights else ";\n")
+        stream.write("}\n")
+
+    def write_graphml(self, stream):
+        """ Writes the graph in GraphML format (xml) to a file-like object in a single pass over the nodes,
+        writing each node followed by its links. Payloads are written as json text in a 'payload' attribute
+        (non-serializable values are converted to strings), and link weights in a 'weight' attribute. Extra
+        memory does not depend on the size of the graph.
+        """
+        stream.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        stream.write('<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n')
+        stream.write('  <key id="payload" for="node" attr.name="payload" attr.type="string"/>\n')
+        if self.__has_weights:
+            stream.write('  <key id="weight" for="edge" attr.name="weight" attr.type="double"/>\n')
+        stream.write('  <graph edgedefault="undirected">\n')
 
-    def dfs_traverse(self, init_id):
+        for nd, near, pload in self.__store.iter_node_data():
+            if pload is None:
+                stream.write('    <node id={}/>\n'.format(saxutils.quoteattr(str(nd))))
+            else:
+                text = json.dumps(pload, ensure_ascii=False, default=str)
+                stream.write('    <node id={}><data key="payload">{}</data></node>\n'.format(
+                    saxutils.quoteattr(str(nd)), saxutils.escape(text)))
+            for link in self.__own_links(nd, near):
+                source, target = saxutils.quoteattr(str(link[0])), saxutils.quoteattr(str(link[1]))
+                if self.__has_weights:
+                    stream.write('    <edge source={} target={}><data key="weight">{}</data></edge>\n'.format(
+                        source, target, link[2]))
+                else:
+                    stream.write('    <edge source={} target={}/>\n'.format(source, target))
+
+        stream.write('  </graph>\n')
+        stream.write('</graphml>\n')
+
+    def dfs_traverse(self, init_id, restrict_to=None):
         """Use the Depth-First Search (DFS) algorithm for graph traversal starting with a node
         defined by its string or integer ID (init_id). Returns a list of visited nodes in the order
-        in which they have been visited.
+        in which they have been visited. If restrict_to is given (a set of node IDs, e.g. the result
+        of find_nodes), the traversal only moves to nodes in that set.
+            The traversal is iterative, so its depth is not limited by the recursion limit of Python.
         """
 
         visited = [init_id]
-        path = [init_id]
-        self.__rec_dfs_traverse(init_id, visited, path)
+        seen = {init_id}
+        # The traversal path keeps, for each node, an iterator over the neighbors that it has not tried yet
+        path = [iter(self.get_neighbors(init_id))]
+        while path:
+            selected = None
+            for link in path[-1]:
+                if link not in seen and (restrict_to is None or link in restrict_to):
+                    selected = link
+                    break
+
+            # If a link has not been visited then visit the node; otherwise backtrack to the previous node
+            if selected is not None:
+                visited.append(selected)
+                seen.add(selected)
+                path.append(iter(self.get_neighbors(selected)))
+            else:
+                path.pop()
         return visited
 
-    def __rec_dfs_traverse(self, current, visited, path):
-        """ (Private method) Process graph node and continue to next node recursively
-        using the DFS strategy. The input arguments are:
-            current: The current node ID which is being processed
-            visited: A list of visited nodes
-            path: A list of nodes representing the traversal path
+    def strongest_first_traverse(self, init_id, restrict_to=None):
+        """ Traverses the graph depth-first from a node identified by its ID (init_id), always following the
+        strongest link (highest weight) to a node that has not been visited, and backtracking when a node has
+        no such link. Returns a list of visited nodes in the order in which they have been visited (an empty
+        list if the node does not exist). restrict_to has the same meaning as in dfs_traverse(). Each node
+        scans its links, sorted by weight (see top_k_neighbors()), at most once.
         """
+        if self.node_does_not_exist(init_id):
+            return []
 
-        # define when to terminate recursion
-        if len(path) == 0:
-            return
-
-        # determine the links (edges) for the current node
-        links = self.get_neighbors(current)
-
-        # determine if any of the links has not been visited
-        found = False
-        selected = None
-        for link in links:
-            if link not in visited:
-                found = True
-                selected = link
-                break
-
-        # If a link has not been visited then vist the node and repeat process (recursion)
-        if found:
+        visited = [init_id]
+        seen = {init_id}
+        path = [(init_id, len(self.__weight_sorted_links(init_id)[1]))]
+        while path:
+            current, pos = path.pop()
+            near = self.__weight_sorted_links(current)[1]
+            while pos > 0 and (near[pos - 1] in seen or
+                               (restrict_to is not None and near[pos - 1] not in restrict_to)):
+                pos -= 1
+            if pos == 0:
+                continue
+
+            selected = near[pos - 1]
+            path.append((current, pos - 1))
             visited.append(selected)
-            path.append(selected)
-            self.__rec_dfs_traverse(selected, visited, path)
-
-        # If all links have been visited then backtrack to previous entry in path and repeat process (recursion)
-        else:
-            path.pop()
-            if len(path) != 0:
-                new_current = path[len(path) - 1]
-            else:
-                new_current = None  # If the path is empty there is no current node
-
-            self.__rec_dfs_traverse(new_current, visited, path)
+            seen.add(selected)
+            path.append((selected, len(self.__weight_sorted_links(selected)[1])))
+        return visited
 
-    def bfs_traverse(self, init_id):
+    def bfs_traverse(self, init_id, restrict_to=None):
         """ Use the Breadth-First Search (BFS) algorithm for graph traversal starting from a node identified by
         its string or integer ID (init_id). Returns a list of visited nodes in the order in which they have
-        been visited
+        been visited. If restrict_to is given (a set of node IDs, e.g. the result of find_nodes), the
+        traversal only moves to nodes in that set.
+            The traversal is iterative, so its depth is not limited by the recursion limit of Python.
         """
 
         visited = [init_id]
+        seen = {init_id}
         stack = [init_id]
-        self.__rec_bfs_traverse(visited, stack)
+        while stack:
+            # get current working node from a LIFO stack and add its unvisited neighbors to the visited list
+            current = stack.pop()
+            for link in self.get_neighbors(current):
+                if link not in seen and (restrict_to is None or link in restrict_to):
+                    visited.append(link)
+                    seen.add(link)
+                    stack.append(link)
         return visited
 
-    def __rec_bfs_traverse(self, visited, stack):
-        """ (Private method) Process graph node and continue to next node recursively using the BFS strategy.
-        The input arguments are:
-            visited: A list of visited nodes identified by their IDs
-            stack: A list of nodes representing the processed nodes
-        """
-
-        # define when to terminate recursion
-        if len(stack) == 0:
-            return
-
-        # get current working node from a LIFO stack and find its neighbors
-        current = stack.pop()
-        links = self.get_neighbors(current)
-
-        # find the subset of neighbors that have not yet been visited
-        unvisited = []
-        for link in links:
-            if link not in visited:
-                unvisited.append(link)
-
-        # add univisted neighbors to the visited list and to the stack
-        if len(unvisited) != 0:
-            for unv in unvisited:
-                visited.append(unv)
-                stack.append(unv)
-            self.__rec_bfs_traverse(visited, stack)
-        # if there are no unvisited neighbors then continue recursion
-        else:
-            self.__rec_bfs_traverse(visited, stack)
-
     def save_json(self, filepath, pretty=False):
         """ Saves graph data as a text file to the file whose path is given by filepath. Uses
         a json format with readable blank spaces (pretty is True) or without blank spaces (pretty is False).
@@ -448,32 +1346,177 @@ class Graph(object):
             else:
                 json.dump(self.__do_serializable(), jf, ensure_ascii=False, sort_keys=True)
 
-    def load_json(self, filepath):
+    def load_json(self, filepath, lazy=False, cache_size=DEFAULT_CACHE_SIZE):
         """ Loads graph data from a text file (json format) whose file is given by filepath.
+            If lazy is True, the file is not parsed at once. The graph is served by a LazyJSONStorage
+        backend that materializes nodes, links and payloads when they are first used, keeping at most
+        cache_size unmodified nodes in memory. The current storage backend is closed and replaced.
         """
-        with open(filepath, "r") as jf:
-            recovered_data = json.load(jf)
-        self.__undo_serializable(recovered_data)
+        if lazy:
+            self.__store.close()
+            self.__store = LazyJSONStorage(filepath, cache_size)
+            self.__reset_degree_index()
+            self.__rebuild_payload_indexes()
+        else:
+            with open(filepath, "r") as jf:
+                recovered_data = json.load(jf)
+            self.__undo_serializable(recovered_data)
+
+        # The journal only records changes, so a full replacement of the data requires a new snapshot
+        if self.__journal is not None:
+            self.checkpoint(force=True)
+
+    def open_journal(self, journal_path, snapshot_path):
+        """ Starts recording every change to the graph (added or removed nodes, links and payloads) in an
+        append-only journal file (journal_path). Each change is written as a short json line, so saving a
+        small batch of changes costs time proportional to the batch and not to the graph size.
+            The journal works together with a snapshot file (snapshot_path) written by checkpoint() in the
+        format of save_json. Node IDs and payloads must be json-serializable. Use recover() to rebuild the
+        graph from the snapshot and the journal (e.g. after a crash) before opening the journal again.
+        """
+        self.close_journal()
+        self.__journal_path = journal_path
+        self.__snapshot_path = snapshot_path
+        self.__journal = open(journal_path, "a")
+        self.__journal_records = 0
+
+        # A graph that has no snapshot yet starts with a full snapshot of its current data
+        if not os.path.exists(snapshot_path):
+            self.checkpoint(force=True)
+
+    def close_journal(self):
+        """ Flushes pending journal records to disk and stops journaling """
+        if self.__journal is not None:
+            self.__sync_journal()
+            self.__journal.close()
+            self.__journal = None
+
+    def checkpoint(self, force=False):
+        """ Makes all recorded changes durable. Pending journal records are flushed to disk, which costs
+        time proportional to the number of changes. When the journal grows beyond JOURNAL_COMPACT_RATIO
+        records per graph node (or if force is True) the journal is compacted: the whole graph is written
+        to the snapshot file and the journal is emptied. Compaction cost is therefore amortized over the
+        recorded changes. Returns True if the journal was compacted.
+        """
+        if self.__journal is None:
+            return False
+
+        self.__sync_journal()
+        if not force and self.__journal_records <= JOURNAL_COMPACT_RATIO * self.size():
+            return False
+
+        # Write the new snapshot atomically, then empty the journal. If the process stops between both
+        # steps, replaying the old journal on the new snapshot produces the same graph. The snapshot and
+        # its directory entry must be on disk before the journal is emptied.
+        temp_path = self.__snapshot_path + ".tmp"
+        with open(temp_path, "w") as jf:
+            json.dump(self.__do_serializable(), jf, ensure_ascii=False, sort_keys=True)
+            jf.flush()
+            os.fsync(jf.fileno())
+        os.replace(temp_path, self.__snapshot_path)
+        self.__sync_directory(self.__snapshot_path)
+
+        self.__journal.close()
+        self.__journal = open(self.__journal_path, "w")
+        self.__sync_journal()
+        self.__journal_records = 0
+        return True
+
+    def recover(self, snapshot_path, journal_path):
+        """ Rebuilds the graph from the last snapshot (snapshot_path) and replays the changes recorded
+        in the journal (journal_path). Missing files are ignored, and an incomplete last journal record
+        (e.g. after a crash) is discarded. Returns the number of replayed changes.
+        """
+        self.close_journal()
+        if os.path.exists(snapshot_path):
+            self.load_json(snapshot_path)
+        else:
+            self.__store.clear()
+            self.__reset_degree_index()
+            self.__rebuild_payload_indexes()
+
+        if not os.path.exists(journal_path):
+            return 0
+
+        count = 0
+        with open(journal_path, "r") as jf, self.__store.transaction():
+            for line in jf:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                self.__replay(record)
+                count += 1
+        return count
+
+    def __log(self, operation, *args):
+        """ (Private method) Appends a change record to the journal if journaling is on """
+        if self.__journal is not None:
+            self.__journal.write(json.dumps([operation] + list(args), ensure_ascii=False) + "\n")
+            self.__journal_records += 1
+
+    def __sync_journal(self):
+        """ (Private method) Forces journal records written so far to be stored on disk """
+        self.__journal.flush()
+        os.fsync(self.__journal.fileno())
+
+    @staticmethod
+    def __sync_directory(filepath):
+        """ (Private method) Forces the directory entry of a file (e.g. after a rename) to be stored on
+        disk. Directories cannot be opened on Windows, where this method does nothing.
+        """
+        if os.name == "nt":
+            return
+        fd = os.open(os.path.dirname(os.path.abspath(filepath)), os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def __replay(self, record):
+        """ (Private method) Applies a change record read from the journal """
+        operation, args = record[0], record[1:]
+        if operation == "an":
+            self.add_node(args[0])
+        elif operation == "rn":
+            self.remove_node(args[0])
+        elif operation == "al":
+            self.add_link(args[0], args[1], args[2])
+        elif operation == "rl":
+            self.remove_link_between_nodes(args[0], args[1])
+        elif operation == "ap":
+            self.add_payload(args[0], args[1])
+        elif operation == "rp":
+            self.remove_payload(args[0])
 
     def __do_serializable(self):
         """ Takes graph data and converts into a dictionary that can be json-serialized for storage.
         Returns the output dictionary.
         """
-        data_clone = copy.deepcopy(self.__data)
-        for nd in data_clone.keys():
-            nb_list = list(data_clone[nd]['near'])
+        data_clone = {}
+        for nd in self.__store.node_ids():
+            nb_list = list(self.__store.get_near(nd))
             nb_list_of_lists = [list(elem) for elem in nb_list]
-            data_clone[nd]['neighbors'] = nb_list_of_lists
-            del data_clone[nd]['near']
+            # json keys must be strings; json.dumps keeps IDs such as 1 and "1" apart
+            data_clone[json.dumps(nd, ensure_ascii=False)] = {
+                'id': nd, 'neighbors': nb_list_of_lists, 'payload': copy.deepcopy(self.__store.get_payload(nd))}
         return data_clone
 
     def __undo_serializable(self, recovered_dict):
-        """ Takes a dictionary from saved data (recovered_dict) and loads the dictionary as graph data. """
-        self.__data = copy.deepcopy(recovered_dict)
-        for nd in self.__data.keys():
-            list_of_tuples = [tuple(elem) for elem in recovered_dict[nd]['neighbors']]
-            self.__data[nd]['near'] = set(list_of_tuples)
-            del self.__data[nd]['neighbors']
+        """ Takes a dictionary from saved data (recovered_dict) and loads the dictionary as graph data.
+        Json object keys are always strings, so the original node ID is taken from the 'id' entry of
+        each node (files saved by older versions have no 'id' entry and keep the key).
+        """
+        self.__store.clear()
+        with self.__store.transaction():
+            for key, record in recovered_dict.items():
+                nd = record.get('id', key)
+                self.__store.add_node(nd)
+                for elem in record['neighbors']:
+                    self.__store.add_near(nd, tuple(elem))
+                self.__store.set_payload(nd, copy.deepcopy(record['payload']))
+        self.__reset_degree_index()
+        self.__rebuild_payload_indexes()
 
     def is_connected_graph(self, init_id):
         """ Determines if the graph is a fully connected graph, i.e. it has no isolated nodes.
@@ -545,7 +1588,7 @@ class Graph(object):
         """ Use a Breadth-First Search (BFS) strategy to obtain the shortest path between an initial node
         and a destination node.
             Returns a list of nodes defining the shortest path between the two nodes. If any of the nodes
-        does not exist, it returns an empty list.
+        does not exist or if the destination cannot be reached, it returns an empty list.
         """
 
         if self.node_does_not_exist(init_id) or self.node_does_not_exist(dest_id):
@@ -554,51 +1597,2341 @@ class Graph(object):
         if init_id == dest_id:
             return [init_id]
 
-        # Initialize map of layers
-        layer_count = 0
-        vis_map = {init_id: layer_count}
-
-        finished = False
+        # Visit the graph layer by layer, keeping the node from which each node was reached
+        parent = {init_id: None}
         layer_nodes = [init_id]
-
-        # Iterate through the graph to tag each node with a layer value
-        while not finished:
-            layer_count += 1
+        while layer_nodes and dest_id not in parent:
             new_layer_nodes = []
-
             for nd in layer_nodes:
                 for nid in self.get_neighbors(nd):
-                    if nid not in vis_map.keys():
-                        vis_map[nid] = layer_count
+                    if nid not in parent:
+                        parent[nid] = nd
                         new_layer_nodes.append(nid)
+            layer_nodes = new_layer_nodes
+
+        if dest_id not in parent:
+            return []
+
+        # Backtrack from destination to initial node to find path
+        node_path = [dest_id]
+        while node_path[-1] != init_id:
+            node_path.append(parent[node_path[-1]])
+
+        # Return reversed path
+        return node_path[::-1]
+
+    def astar_path(self, init_id, dest_id, heuristic=None, stats=None):
+        """ Uses the A* algorithm to find the lowest-cost path between an initial node and a destination
+        node. In graphs with weights the cost of a link is its weight; otherwise every link costs 1.
+            heuristic: Function called as heuristic(node_id, dest_id) that estimates the cost of the path
+                       from a node to the destination. It must never overestimate the cost. Nodes closer
+                       to the destination are explored first, so a good heuristic explores a small part of
+                       the graph. See EuclideanHeuristic and HaversineHeuristic for heuristics based on
+                       coordinates stored in payloads. Without a heuristic this is Dijkstra's algorithm.
+            stats: Optional dictionary that receives search statistics: 'expanded' (number of expanded
+                   nodes), 'pushed' (queue insertions), 'heuristic_calls' and 'cost' (path cost)
+        Returns a list of nodes defining the path. If any of the nodes does not exist or if the
+        destination cannot be reached, it returns an empty list.
+        """
+        if self.node_does_not_exist(init_id) or self.node_does_not_exist(dest_id):
+            return []
+
+        if self.__has_weights:
+            links = lambda nd: self.__store.get_near(nd)
+        else:
+            links = lambda nd: [(elem[0], 1) for elem in self.__store.get_near(nd)]
+
+        return _astar_search(init_id, dest_id, heuristic, links, stats)
+
+    def pagerank(self, damping=0.85, tol=1.0e-6, max_iter=100, weighted=True, personalization=None, start=None):
+        """ Computes the PageRank of every node. Returns a dictionary that maps each node ID to its score.
+        The computation runs on an array-backed copy of the graph; see FrozenGraph.pagerank() for the
+        description of the arguments. Pass a previous result as start to speed up the computation
+        after small updates of the graph.
+        """
+        return self.freeze().pagerank(damping, tol, max_iter, weighted, personalization, start)
+
+    def eigenvector_centrality(self, tol=1.0e-6, max_iter=100, weighted=True, start=None):
+        """ Computes the eigenvector centrality of every node. Returns a dictionary that maps each node ID
+        to its score. See FrozenGraph.eigenvector_centrality() for the description of the arguments.
+        """
+        return self.freeze().eigenvector_centrality(tol, max_iter, weighted, start)
+
+    def betweenness_centrality(self, normalized=True, weighted=True, samples=None, seed=None, processes=1,
+                               chunk_size=None, progress=None):
+        """ Computes the betweenness centrality of every node (exact, or approximated from a sample of source
+        nodes). Returns a dictionary that maps each node ID to its score. The work can be split among several
+        processes; see FrozenGraph.betweenness_centrality() for the description of the arguments.
+        """
+        return self.freeze().betweenness_centrality(normalized, weighted, samples, seed, processes, chunk_size,
+                                                    progress)
+
+    def closeness_centrality(self, weighted=True, processes=1, chunk_size=None, progress=None):
+        """ Computes the closeness centrality of every node. Returns a dictionary that maps each node ID to
+        its score. See FrozenGraph.closeness_centrality() for the description of the arguments.
+        """
+        return self.freeze().closeness_centrality(weighted, processes, chunk_size, progress)
+
+    def connected_components(self):
+        """ Returns the connected components of the graph as a list of sets of node IDs, largest first """
+        return self.freeze().connected_components()
+
+    def eccentricity(self, node_id=None, processes=1):
+        """ Returns the eccentricity of a node: the largest number of hops to any node of its connected
+        component (None if the node does not exist). If node_id is None, returns a dictionary with the
+        eccentricity of every node (see FrozenGraph.eccentricity()).
+        """
+        if node_id is None:
+            return self.freeze().eccentricity(processes=processes)
+        if self.node_does_not_exist(node_id):
+            return None
+
+        layer = [node_id]
+        visited = {node_id}
+        depth = -1
+        while layer:
+            depth += 1
+            next_layer = []
+            for nd in layer:
+                for elem in self.__store.get_near(nd):
+                    if elem[0] not in visited:
+                        visited.add(elem[0])
+                        next_layer.append(elem[0])
+            layer = next_layer
+        return depth
+
+    def diameter(self, exact=True, per_component=False):
+        """ Returns the diameter of the graph, computed per connected component on an array-backed copy.
+        See FrozenGraph.diameter() for the description of the arguments.
+        """
+        return self.freeze().diameter(exact, per_component)
+
+    def diameter_bounds(self, max_bfs=None, per_component=False):
+        """ Returns (lower, upper) bounds of the diameter of the graph. See FrozenGraph.diameter_bounds()
+        for the description of the arguments.
+        """
+        return self.freeze().diameter_bounds(max_bfs, per_component)
+
+    def radius(self, exact=True, per_component=False, processes=1):
+        """ Returns the radius of the largest connected component of the graph, or of every component.
+        See FrozenGraph.radius() for the description of the arguments.
+        """
+        return self.freeze().radius(exact, per_component, processes)
+
+    def minimum_spanning_tree(self, algorithm="auto", as_graph=True):
+        """ Computes a minimum spanning forest: a minimum spanning tree for each connected component. The
+        links are extracted in bulk into an array-backed copy of the graph, and the algorithm is chosen as
+        described in FrozenGraph.minimum_spanning_edges().
+            Returns a new Graph with all the nodes and the links of the forest (payloads are not copied), or
+        the list of links of the forest if as_graph is False.
+        """
+        links = self.freeze().minimum_spanning_edges(algorithm)
+        if not as_graph:
+            return links
+
+        forest = Graph(has_weights=self.__has_weights)
+        forest.add_nodes_from_list(self.get_nodes())
+        forest.add_links_from_list(links)
+        return forest
+
+    def triangles(self, node_id=None, processes=1):
+        """ Counts triangles (groups of three nodes linked to each other). Returns the number of triangles
+        that include a node identified by its ID (None if the node does not exist), or a dictionary with the
+        count of every node if node_id is None. Counting all triangles runs on an array-backed copy of the
+        graph and can be split among several worker processes (see FrozenGraph.triangles()).
+        """
+        if node_id is None:
+            return self.freeze().triangles(processes=processes)
+        if self.node_does_not_exist(node_id):
+            return None
+
+        nbors = set(self.get_neighbors(node_id))
+        nbors.discard(node_id)
+        count = sum(1 for nb in nbors for elem in self.__store.get_near(nb) if elem[0] in nbors)
+        return count // 2
+
+    def local_clustering(self, node_id):
+        """ Returns the local clustering coefficient of a node: the fraction of pairs of its neighbors that
+        are neighbors of each other. Returns None if the node does not exist.
+        """
+        if self.node_does_not_exist(node_id):
+            return None
+        degree = len(set(self.get_neighbors(node_id)) - {node_id})
+        if degree < 2:
+            return 0.0
+        return 2.0 * self.triangles(node_id) / (degree * (degree - 1))
+
+    def average_clustering(self, samples=None, seed=None, processes=1):
+        """ Returns the average of the local clustering coefficients of all nodes, exact or estimated from
+        a sample of nodes. See FrozenGraph.average_clustering() for the description of the arguments.
+        """
+        return self.freeze().average_clustering(samples, seed, processes)
+
+    def transitivity(self, samples=None, seed=None, processes=1):
+        """ Returns the global clustering coefficient (fraction of closed triples of nodes), exact or
+        estimated from a sample of triples. See FrozenGraph.transitivity() for the description of the arguments.
+        """
+        return self.freeze().transitivity(samples, seed, processes)
+
+    def random_walks(self, walk_length=80, walks_per_node=1, mode="uniform", p=1.0, q=1.0, seed=None,
+                     start_nodes=None, chunk_size=DEFAULT_WALK_CHUNK, processes=1):
+        """ Generates random walks from every node (or from the nodes in start_nodes) and yields them in
+        chunks (lists of walks, each walk being a list of node IDs). See RandomWalker for the walk modes
+        and the meaning of p, q and seed.
+        """
+        walker = RandomWalker(self, mode, p, q, seed)
+        return walker.walks(start_nodes, walk_length, walks_per_node, chunk_size, processes)
+
+    def label_propagation(self, variant="async", weighted=False, max_iter=100, tol=0.0, seed=None, processes=1,
+                          as_sets=False):
+        """ Detects communities by label propagation on an array-backed copy of the graph. See
+        FrozenGraph.label_propagation() for the description of the arguments and of the result.
+        """
+        return self.freeze().label_propagation(variant, weighted, max_iter, tol, seed, processes,
+                                               as_sets=as_sets)
+
+    def louvain(self, weighted=False, resolution=1.0, tol=1e-7, seed=None, as_sets=False):
+        """ Detects communities with the Louvain method on an array-backed copy of the graph. See
+        FrozenGraph.louvain() for the description of the arguments and of the result.
+        """
+        return self.freeze().louvain(weighted, resolution, tol, seed, as_sets)
+
+    def modularity(self, communities, weighted=False, resolution=1.0):
+        """ Returns the modularity of a division of the graph into communities (a dictionary of community
+        labels by node ID or a list of sets of node IDs).
+        """
+        return self.freeze().modularity(communities, weighted, resolution)
+
+    def subgraph(self, node_ids):
+        """ Returns a new Graph with the nodes of node_ids that exist (e.g. a community or the result of
+        find_nodes), the links between them and their payloads. Only the links of the selected nodes are
+        read, so the cost does not depend on the size of the graph.
+        """
+        selected = [nd for nd in node_ids if self.node_exists(nd)]
+        members = set(selected)
+        result = Graph(has_weights=self.__has_weights)
+        result.add_nodes_from_list(selected)
+        for nd in selected:
+            payload = self.__store.get_payload(nd)
+            if payload is not None:
+                result.add_payload(nd, copy.deepcopy(payload))
+            result.add_links_from_list([link for link in self.__own_links(nd, self.__store.get_near(nd))
+                                        if link[1] in members])
+        return result
+
+    def k_hop_neighborhoods(self, seeds, k, max_size=None, hub_degree=None):
+        """ Finds the nodes within k hops of each seed node (the ego network of the seed). All the seeds are
+        expanded together, so the links of a node shared by several neighborhoods are read once per layer.
+        Returns a dictionary that maps each seed to a dictionary of reached nodes and their depths (the seed
+        has depth 0). Seeds that do not exist get an empty dictionary.
+            max_size: Maximum number of nodes in a neighborhood, which bounds the work per seed
+            hub_degree: Nodes with more neighbors than this value are included in a neighborhood but the
+                        expansion does not continue through them
+        For many queries on a graph that does not change, use the same method of a FrozenGraph.
+        """
+        valid_seeds = [seed for seed in seeds if self.node_exists(seed)]
+        reached = _k_hop_expand(valid_seeds, k, max_size, hub_degree,
+                                lambda nd: [elem[0] for elem in self.__store.get_near(nd)], self.degree)
+
+        response = {seed: {} for seed in seeds}
+        response.update(zip(valid_seeds, reached))
+        return response
+
+
+class FrozenGraph(object):
+    """ Read-only copy of a graph kept in flat arrays using a compressed sparse row (CSR) layout.
+
+    Nodes are numbered 0 to n-1 following the order of node_ids. The neighbors of node number k are
+    the node numbers targets[offsets[k]:offsets[k + 1]], and the weights of these links are found at
+    the same positions of weights (None for graphs without weights). Payloads are given by a sequence
+    indexed by node number (or None if the graph has no payloads).
+
+    The arrays can be any objects that support indexing, slicing and len(), e.g. array.array objects
+    or memoryviews over shared buffers (see SharedGraph). A FrozenGraph is usually created by calling
+    Graph.freeze(). It offers the read methods of the Graph class; traversals work with node numbers
+    internally and are therefore faster than the same traversals on a Graph.
+    """
+
+    def __init__(self, node_ids, offsets, targets, weights=None, payloads=None):
+        self.__node_ids = node_ids
+        self.__index = {nd: k for k, nd in enumerate(node_ids)}    # maps node IDs to node numbers
+        self.__offsets = offsets
+        self.__targets = targets
+        self.__weights = weights
+        self.__payloads = payloads
+
+    @classmethod
+    def from_graph(cls, graph):
+        """ Creates a FrozenGraph with the nodes, links and payloads of a Graph object """
+        has_weights = graph.has_weights()
+        node_ids = []
+        payloads = []
+        target_ids = []
+        offsets = array.array('q', [0])
+        weights = array.array('d') if has_weights else None
+
+        # Single bulk pass over the graph data; neighbor IDs are converted to node numbers afterwards
+        for nd, near, payload in graph.iter_node_data():
+            node_ids.append(nd)
+            payloads.append(payload)
+            for elem in near:
+                target_ids.append(elem[0])
+                if has_weights:
+                    weights.append(elem[1])
+            offsets.append(len(target_ids))
+
+        index = {nd: k for k, nd in enumerate(node_ids)}
+        targets = array.array('q', [index[nb] for nb in target_ids])
+        return cls(node_ids, offsets, targets, weights, payloads)
+
+    @property
+    def offsets(self):
+        """ Array with the position in targets of the first neighbor of each node (n + 1 elements) """
+        return self.__offsets
+
+    @property
+    def targets(self):
+        """ Array with the node numbers of the neighbors of all nodes """
+        return self.__targets
+
+    @property
+    def weights(self):
+        """ Array with the weight of each link in targets (None for graphs without weights) """
+        return self.__weights
+
+    def has_weights(self):
+        """ Returns True if the graph has link weights """
+        return self.__weights is not None
+
+    def size(self):
+        """ Provides the number of nodes in the graph """
+        return len(self.__node_ids)
+
+    def get_nodes(self):
+        """ Returns the list of all nodes (identified by their IDs) in the graph """
+        return self.__node_ids
+
+    def index_of(self, node_id):
+        """ Returns the node number of a node identified by its ID or None if the node does not exist """
+        return self.__index.get(node_id)
+
+    def node_at(self, index):
+        """ Returns the ID of the node identified by a node number """
+        return self.__node_ids[index]
+
+    def neighbor_indices(self, index):
+        """ Returns the node numbers of the neighbors of a node identified by its node number """
+        return self.__targets[self.__offsets[index]:self.__offsets[index + 1]]
+
+    def node_exists(self, node_id):
+        """ Returns True if a node identified by its ID exists in the graph """
+        return node_id in self.__index
+
+    def node_does_not_exist(self, node_id):
+        """ Returns True if a node identified by its ID does not exist in the graph """
+        return node_id not in self.__index
+
+    def are_neighbors(self, init_id, dest_id):
+        """ Returns True if two nodes are neighbors. Returns False if they are not neighbors or if any
+        of the nodes does not exist.
+        """
+        if self.node_exists(init_id) and self.node_exists(dest_id):
+            return self.__index[dest_id] in self.neighbor_indices(self.__index[init_id])
+        else:
+            return False
+
+    def are_not_neighbors(self, init_id, dest_id):
+        """ Returns True if two nodes are not neighbors """
+        return False if self.are_neighbors(init_id, dest_id) else True
+
+    def get_links(self, node_id):
+        """ Returns a list of links for a node identified by its ID, using the same format as
+        Graph.get_links(). Returns None if the node does not exist.
+        """
+        if self.node_does_not_exist(node_id):
+            return None
+
+        k = self.__index[node_id]
+        start, end = self.__offsets[k], self.__offsets[k + 1]
+        if self.__weights is not None:
+            return [(node_id, self.__node_ids[self.__targets[p]], self.__weights[p]) for p in range(start, end)]
+        else:
+            return [(node_id, self.__node_ids[self.__targets[p]]) for p in range(start, end)]
+
+    def get_neighbors(self, node_id):
+        """ Returns a list of neighbor nodes for a node identified by its ID or None if the node does
+        not exist.
+        """
+        if self.node_does_not_exist(node_id):
+            return None
+        return [self.__node_ids[nb] for nb in self.neighbor_indices(self.__index[node_id])]
+
+    def get_payload(self, node_id):
+        """ Returns the payload of a node. Returns None if the node does not exist or has no payload """
+        if self.node_does_not_exist(node_id) or self.__payloads is None:
+            return None
+        return self.__payloads[self.__index[node_id]]
+
+    def has_payload(self, node_id):
+        """ Returns True if a node has a payload """
+        return self.get_payload(node_id) is not None
+
+    def payload_exist(self, node_id):
+        """ Returns True if a node has a payload """
+        return self.has_payload(node_id)
+
+    def payload_does_not_exist(self, node_id):
+        """ Returns True if a node has no payload """
+        return False if self.has_payload(node_id) else True
+
+    def dfs_traverse(self, init_id):
+        """ Traverses the graph using a Depth-First Search (DFS) starting from a node identified by its ID.
+        Returns the list of visited nodes in the order in which they have been visited (an empty list
+        if the start node does not exist).
+        """
+        if self.node_does_not_exist(init_id):
+            return []
+
+        start = self.__index[init_id]
+        visited = bytearray(self.size())
+        visited[start] = 1
+        order = [start]
+        stack = [(start, self.__offsets[start])]
+
+        while stack:
+            current, pos = stack[-1]
+            end = self.__offsets[current + 1]
+            while pos < end and visited[self.__targets[pos]]:
+                pos += 1
+
+            if pos < end:
+                selected = self.__targets[pos]
+                stack[-1] = (current, pos + 1)
+                visited[selected] = 1
+                order.append(selected)
+                stack.append((selected, self.__offsets[selected]))
+            else:
+                stack.pop()
+
+        return [self.__node_ids[k] for k in order]
+
+    def bfs_traverse(self, init_id):
+        """ Traverses the graph using a Breadth-First Search (BFS) starting from a node identified by its ID.
+        Returns the list of visited nodes in the order in which they have been visited (an empty list
+        if the start node does not exist).
+        """
+        if self.node_does_not_exist(init_id):
+            return []
+
+        start = self.__index[init_id]
+        visited = bytearray(self.size())
+        visited[start] = 1
+        order = [start]
+        queue = collections.deque([start])
+
+        while queue:
+            current = queue.popleft()
+            for nb in self.neighbor_indices(current):
+                if not visited[nb]:
+                    visited[nb] = 1
+                    order.append(nb)
+                    queue.append(nb)
+
+        return [self.__node_ids[k] for k in order]
+
+    def is_connected_graph(self, init_id):
+        """ Determines if the graph is a fully connected graph starting the test from a node
+        identified by its ID. Returns True or False.
+        """
+        return len(self.bfs_traverse(init_id)) == self.size()
+
+    def get_depth_layer(self, node_id, layer):
+        """ Returns the list of nodes at a certain depth level (layer) from the start node, using the
+        same format as Graph.get_depth_layer().
+        """
+        if layer == 0:
+            return {'layer': 0, 'nodes': [node_id]}
+
+        visited = bytearray(self.size())
+        layer_nodes = [self.__index[node_id]]
+        visited[layer_nodes[0]] = 1
+        layer_count = 0
+
+        while layer_count < layer:
+            new_layer_nodes = []
+            for nd in layer_nodes:
+                for nb in self.neighbor_indices(nd):
+                    if not visited[nb]:
+                        visited[nb] = 1
+                        new_layer_nodes.append(nb)
 
             if len(new_layer_nodes) == 0:
-                finished = True
-                layer_count -= 1
+                break
+
+            layer_count += 1
+            layer_nodes = new_layer_nodes
+
+        return {'layer': layer_count,
+                'nodes': [self.__node_ids[k] for k in layer_nodes]}
+
+    def is_node_in_layer(self, start_node, target_node, layer):
+        """ Checks if a target node exists at a given depth layer from a start node. Returns False
+        if the nodes are not graph members.
+        """
+        if self.node_does_not_exist(start_node) or self.node_does_not_exist(target_node):
+            return False
+
+        result = self.get_depth_layer(start_node, layer)
+
+        if result["layer"] < layer:
+            return False
+        else:
+            return True if target_node in result["nodes"] else False
+
+    def shortest_path(self, init_id, dest_id):
+        """ Uses a Breadth-First Search (BFS) to obtain the shortest path between an initial node and a
+        destination node. Returns the list of nodes in the path, or an empty list if any of the nodes
+        does not exist or if the destination cannot be reached.
+        """
+        if self.node_does_not_exist(init_id) or self.node_does_not_exist(dest_id):
+            return []
 
+        if init_id == dest_id:
+            return [init_id]
+
+        start, goal = self.__index[init_id], self.__index[dest_id]
+        parent = array.array('q', [-1]) * self.size()
+        parent[start] = start
+        queue = collections.deque([start])
+
+        while queue and parent[goal] == -1:
+            current = queue.popleft()
+            for nb in self.neighbor_indices(current):
+                if parent[nb] == -1:
+                    parent[nb] = current
+                    queue.append(nb)
+
+        if parent[goal] == -1:
+            return []
+
+        node_path = [goal]
+        while node_path[-1] != start:
+            node_path.append(parent[node_path[-1]])
+
+        return [self.__node_ids[k] for k in reversed(node_path)]
+
+    def k_hop_neighborhoods(self, seeds, k, max_size=None, hub_degree=None):
+        """ Finds the nodes within k hops of each seed node, expanding all the seeds together over the link
+        arrays. Returns a dictionary that maps each seed to a dictionary of reached nodes and their depths.
+        See Graph.k_hop_neighborhoods() for the description of the arguments.
+        """
+        valid_seeds = [seed for seed in seeds if self.node_exists(seed)]
+        reached = _k_hop_expand([self.__index[seed] for seed in valid_seeds], k, max_size, hub_degree,
+                                self.neighbor_indices)
+
+        response = {seed: {} for seed in seeds}
+        for seed, seed_reached in zip(valid_seeds, reached):
+            response[seed] = {self.__node_ids[nb]: depth for nb, depth in seed_reached.items()}
+        return response
+
+    def __vector_from_dict(self, values, default):
+        """ (Private method) Converts a dictionary that maps node IDs to numbers into a list indexed by
+        node number. Nodes that are not in the dictionary get the default value.
+        """
+        vector = [default] * self.size()
+        for nd, value in values.items():
+            k = self.__index.get(nd)
+            if k is not None:
+                vector[k] = float(value)
+        return vector
+
+    def __link_weights(self, weighted):
+        """ (Private method) Returns the weights used by the centrality methods: the link weights if the
+        graph has weights and weighted is True, or None (every link counts as 1).
+        """
+        return self.__weights if weighted and self.__weights is not None else None
+
+    def pagerank(self, damping=0.85, tol=1.0e-6, max_iter=100, weighted=True, personalization=None, start=None):
+        """ Computes the PageRank of every node using power iteration over the link arrays (vectorized with
+        NumPy when it is installed). Returns a dictionary that maps each node ID to its score (the scores add
+        up to 1).
+            damping: Probability of following a link instead of jumping to a random node
+            tol: The iteration stops when the total change of the scores is below size() * tol
+            max_iter: Maximum number of iterations (the last scores are returned if it is reached)
+            weighted: If True and the graph has weights, a node spreads its score in proportion
+                      to the weights of its links
+            personalization: Optional seed set (list of node IDs) or dictionary that maps node IDs to
+                      positive values. Random jumps land only on these nodes (personalized PageRank)
+            start: Optional dictionary with previous scores (e.g. computed before a small update of
+                      the graph). Used as starting point, it reduces the number of iterations
+        """
+        num_nodes = self.size()
+        if num_nodes == 0:
+            return {}
+
+        offsets, targets = self.__offsets, self.__targets
+        weights = self.__link_weights(weighted)
+
+        # Jump vector: uniform or given by the personalization seeds
+        if personalization is None:
+            jump = [1.0 / num_nodes] * num_nodes
+        else:
+            if not isinstance(personalization, dict):
+                personalization = {nd: 1.0 for nd in personalization}
+            jump = self.__vector_from_dict(personalization, 0.0)
+            total = sum(jump)
+            jump = [value / total for value in jump] if total > 0 else [1.0 / num_nodes] * num_nodes
+
+        # Strength of each node: number of links, or sum of link weights
+        if weights is None:
+            strength = [offsets[k + 1] - offsets[k] for k in range(num_nodes)]
+        else:
+            strength = [sum(weights[offsets[k]:offsets[k + 1]]) for k in range(num_nodes)]
+
+        if start is None:
+            scores = list(jump)
+        else:
+            scores = self.__vector_from_dict(start, 0.0)
+            total = sum(scores)
+            scores = [value / total for value in scores] if total > 0 else list(jump)
+
+        if numpy is not None:
+            scores = self.__numpy_pagerank(damping, tol, max_iter, weights, jump, strength, scores)
+            return {self.__node_ids[k]: scores[k] for k in range(num_nodes)}
+
+        for _ in range(max_iter):
+            new_scores = [0.0] * num_nodes
+            dangling = 0.0
+            for k in range(num_nodes):
+                if strength[k] == 0:
+                    dangling += scores[k]
+                    continue
+                share = damping * scores[k] / strength[k]
+                if weights is None:
+                    for p in range(offsets[k], offsets[k + 1]):
+                        new_scores[targets[p]] += share
+                else:
+                    for p in range(offsets[k], offsets[k + 1]):
+                        new_scores[targets[p]] += share * weights[p]
+
+            # Random jumps and the scores of nodes without links are spread using the jump vector
+            base = damping * dangling + 1.0 - damping
+            change = 0.0
+            for k in range(num_nodes):
+                new_scores[k] += base * jump[k]
+                change += abs(new_scores[k] - scores[k])
+
+            scores = new_scores
+            if change < num_nodes * tol:
+                break
+
+        return {self.__node_ids[k]: scores[k] for k in range(num_nodes)}
+
+    def eigenvector_centrality(self, tol=1.0e-6, max_iter=100, weighted=True, start=None):
+        """ Computes the eigenvector centrality of every node using power iteration over the link arrays
+        (vectorized with NumPy when it is installed). Returns a dictionary that maps each node ID to its
+        score (the vector of scores has unit length).
+            tol: The iteration stops when the total change of the scores is below size() * tol
+            max_iter: Maximum number of iterations (the last scores are returned if it is reached)
+            weighted: If True and the graph has weights, links contribute in proportion to their weights
+            start: Optional dictionary with previous scores used as starting point
+        """
+        num_nodes = self.size()
+        if num_nodes == 0:
+            return {}
+
+        offsets, targets = self.__offsets, self.__targets
+        weights = self.__link_weights(weighted)
+        scores = [1.0] * num_nodes if start is None else self.__vector_from_dict(start, 1.0 / num_nodes)
+
+        if numpy is not None:
+            scores = self.__numpy_eigenvector(tol, max_iter, weights, scores)
+            return {self.__node_ids[k]: scores[k] for k in range(num_nodes)}
+
+        for _ in range(max_iter):
+            # Multiply by (A + I) instead of A, which has the same eigenvectors and avoids oscillations
+            new_scores = list(scores)
+            for k in range(num_nodes):
+                score = scores[k]
+                if weights is None:
+                    for p in range(offsets[k], offsets[k + 1]):
+                        new_scores[targets[p]] += score
+                else:
+                    for p in range(offsets[k], offsets[k + 1]):
+                        new_scores[targets[p]] += score * weights[p]
+
+            norm = math.sqrt(sum(value * value for value in new_scores)) or 1.0
+            new_scores = [value / norm for value in new_scores]
+            change = sum(abs(new_scores[k] - scores[k]) for k in range(num_nodes))
+            scores = new_scores
+            if change < num_nodes * tol:
+                break
+
+        return {self.__node_ids[k]: scores[k] for k in range(num_nodes)}
+
+    def __numpy_links(self, weights):
+        """ (Private method) Returns NumPy arrays with the source node, the target node and the weight (None
+        if every link counts as 1) of each link, used to multiply score vectors by the adjacency matrix.
+        """
+        offsets = numpy.asarray(self.__offsets, dtype=numpy.int64)
+        sources = numpy.repeat(numpy.arange(self.size()), numpy.diff(offsets))
+        targets = numpy.asarray(self.__targets, dtype=numpy.int64)
+        return sources, targets, None if weights is None else numpy.asarray(weights, dtype=numpy.float64)
+
+    def __numpy_pagerank(self, damping, tol, max_iter, weights, jump, strength, scores):
+        """ (Private method) PageRank power iteration with vectorized NumPy operations. Each iteration is
+        a sparse matrix-vector product: the share of every link is computed at once and added up per
+        target node with numpy.bincount. Returns the list of scores by node number.
+        """
+        num_nodes = self.size()
+        sources, targets, link_weights = self.__numpy_links(weights)
+        jump = numpy.asarray(jump, dtype=numpy.float64)
+        strength = numpy.asarray(strength, dtype=numpy.float64)
+        scores = numpy.asarray(scores, dtype=numpy.float64)
+        dangling = strength == 0
+        inverse = numpy.zeros(num_nodes)
+        inverse[~dangling] = 1.0 / strength[~dangling]
+
+        for _ in range(max_iter):
+            shares = (damping * scores * inverse)[sources]
+            if link_weights is not None:
+                shares *= link_weights
+            new_scores = numpy.bincount(targets, weights=shares, minlength=num_nodes)
+            new_scores += (damping * scores[dangling].sum() + 1.0 - damping) * jump
+            change = numpy.abs(new_scores - scores).sum()
+            scores = new_scores
+            if change < num_nodes * tol:
+                break
+        return scores.tolist()
+
+    def __numpy_eigenvector(self, tol, max_iter, weights, scores):
+        """ (Private method) Eigenvector centrality power iteration with vectorized NumPy operations (see
+        __numpy_pagerank). Returns the list of scores by node number.
+        """
+        num_nodes = self.size()
+        sources, targets, link_weights = self.__numpy_links(weights)
+        scores = numpy.asarray(scores, dtype=numpy.float64)
+
+        for _ in range(max_iter):
+            shares = scores[sources]
+            if link_weights is not None:
+                shares = shares * link_weights
+            new_scores = scores + numpy.bincount(targets, weights=shares, minlength=num_nodes)
+            new_scores /= numpy.sqrt(numpy.dot(new_scores, new_scores)) or 1.0
+            change = numpy.abs(new_scores - scores).sum()
+            scores = new_scores
+            if change < num_nodes * tol:
+                break
+        return scores.tolist()
+
+    def betweenness_centrality(self, normalized=True, weighted=True, samples=None, seed=None, processes=1,
+                               chunk_size=None, progress=None):
+        """ Computes the betweenness centrality of every node using Brandes' algorithm. Returns a
+        dictionary that maps each node ID to its score.
+            normalized: If True, scores are divided by the number of node pairs that do not include the node
+            weighted: If True and the graph has weights, link weights are used as link lengths
+            samples: If given, only this number of randomly selected source nodes is used and the scores
+                     are scaled up (an approximation for very large graphs)
+            seed: Seed of the random selection of sources, for reproducible approximations
+            processes: Number of worker processes. Source nodes are split among the workers, which read
+                       the graph from shared memory
+            chunk_size: Number of source nodes processed per task (chosen automatically if not given)
+            progress: Optional function called as progress(done, total) after each task completes
+        """
+        num_nodes = self.size()
+        sources = list(range(num_nodes))
+        if samples is not None and samples < num_nodes:
+            sources = random.Random(seed).sample(sources, samples)
+
+        scores = [0.0] * num_nodes
+        for partial in _run_by_source(self, _betweenness_sources, sources, weighted, processes, chunk_size,
+                                      progress):
+            for k in range(num_nodes):
+                scores[k] += partial[k]
+
+        # Each pair of nodes has been counted in both directions
+        if normalized:
+            scale = 1.0 / ((num_nodes - 1) * (num_nodes - 2)) if num_nodes > 2 else None
+        else:
+            scale = 0.5
+        if scale is not None and len(sources) > 0:
+            scale *= float(num_nodes) / len(sources)
+            scores = [value * scale for value in scores]
+
+        return {self.__node_ids[k]: scores[k] for k in range(num_nodes)}
+
+    def closeness_centrality(self, weighted=True, processes=1, chunk_size=None, progress=None):
+        """ Computes the closeness centrality of every node: the inverse of the average distance to the
+        nodes it can reach, scaled by the fraction of the graph it can reach (so nodes in small components
+        get lower scores). Returns a dictionary that maps each node ID to its score. The arguments have the
+        same meaning as in betweenness_centrality().
+        """
+        scores = {}
+        for partial in _run_by_source(self, _closeness_sources, list(range(self.size())), weighted, processes,
+                                      chunk_size, progress):
+            for k, value in partial:
+                scores[self.__node_ids[k]] = value
+        return scores
+
+    def connected_components(self):
+        """ Returns the connected components of the graph as a list of sets of node IDs, largest first """
+        return [set(self.__node_ids[k] for k in members) for members in self.__components()]
+
+    def __components(self):
+        """ (Private method) Returns the connected components as lists of node numbers, largest first """
+        component = [-1] * self.size()
+        result = []
+        for start in range(self.size()):
+            if component[start] >= 0:
+                continue
+            component[start] = len(result)
+            members = [start]
+            for node in members:
+                for nb in self.neighbor_indices(node):
+                    if component[nb] < 0:
+                        component[nb] = len(result)
+                        members.append(nb)
+            result.append(members)
+        return sorted(result, key=len, reverse=True)
+
+    def eccentricity(self, node_id=None, processes=1, chunk_size=None, progress=None):
+        """ Returns the eccentricity of a node: the largest number of hops to any node of its connected
+        component (None if the node does not exist). If node_id is None, returns a dictionary with the
+        eccentricity of every node, computed with breadth-first searches from ECCENTRICITY_BATCH sources
+        at a time: the sources that reached each node are kept as the bits of an integer, so a node is
+        expanded once per level for the whole batch. The nodes can be split among several worker
+        processes (see betweenness_centrality() for the processes, chunk_size and progress arguments).
+        """
+        if node_id is not None:
+            if self.node_does_not_exist(node_id):
+                return None
+            return max(_hop_distances(self, self.__index[node_id]).values())
+
+        # Sources of the same component are batched together, so batches do not explore unrelated nodes
+        sources = [node for members in self.__components() for node in members]
+        if chunk_size is not None:
+            chunk_size = max(1, chunk_size // ECCENTRICITY_BATCH) * ECCENTRICITY_BATCH
+        else:
+            batches = -(-len(sources) // ECCENTRICITY_BATCH)
+            chunk_size = max(1, batches // (4 * max(1, processes))) * ECCENTRICITY_BATCH
+
+        result = {}
+        for partial in _run_by_source(self, _eccentricity_sources, sources, False, processes, chunk_size,
+                                      progress):
+            for k, value in partial:
+                result[self.__node_ids[k]] = value
+        return result
+
+    def diameter_bounds(self, max_bfs=None, per_component=False):
+        """ Returns (lower, upper) bounds of the diameter of the graph: the largest eccentricity of a node
+        within its connected component. The bounds of each component are found with the iFUB method: a
+        double sweep (two breadth-first searches, from a node of highest degree and from the farthest node
+        found) gives a lower bound and a central node; the nodes are then checked from the farthest
+        from that center inwards, which lowers the upper bound until it meets the lower bound.
+            max_bfs: Maximum number of breadth-first searches after the double sweep in each component
+                     (None for no limit, which makes both bounds equal to the exact diameter; 0 for the
+                     double sweep bounds only)
+            per_component: If True, returns a list of bounds for each component, in the order of
+                           connected_components()
+        """
+        bounds = [self.__ifub(members, max_bfs) for members in self.__components()]
+        if per_component:
+            return [(lower, upper) for lower, upper, _ in bounds]
+        if len(bounds) == 0:
+            return 0, 0
+        return max(lower for lower, _, _ in bounds), max(upper for _, upper, _ in bounds)
+
+    def diameter(self, exact=True, per_component=False):
+        """ Returns the diameter of the graph (the largest eccentricity of a node within its connected
+        component), or a list with the diameter of each component if per_component is True. If exact is
+        False, returns the lower bound found by a double sweep, which is often exact and costs a few
+        breadth-first searches per component (see diameter_bounds()).
+        """
+        result = [lower for lower, _ in self.diameter_bounds(None if exact else 0, per_component=True)]
+        if per_component:
+            return result
+        return max(result) if result else 0
+
+    def radius(self, exact=True, per_component=False, processes=1):
+        """ Returns the radius (the smallest eccentricity of a node) of the largest connected component,
+        or a list with the radius of each component if per_component is True. The exact value uses the
+        eccentricities of all nodes (see eccentricity(), which can use several processes). If exact is
+        False, returns an upper bound: the eccentricity of the central node found by a double sweep.
+        """
+        components = self.__components()
+        if exact:
+            values = self.eccentricity(processes=processes)
+            result = [min(values[self.__node_ids[k]] for k in members) for members in components]
+        else:
+            result = [center for _, _, center in (self.__ifub(members, 0) for members in components)]
+        if per_component:
+            return result
+        return result[0] if result else 0
+
+    def __ifub(self, members, max_bfs):
+        """ (Private method) Runs a double sweep and the iFUB method on a connected component. Returns the
+        lower and upper bounds of its diameter and the eccentricity of its central node.
+        """
+        start = max(members, key=self.__degree)
+        dist_start = _hop_distances(self, start)
+        far_a = max(dist_start, key=dist_start.get)
+        dist_a = _hop_distances(self, far_a)
+        far_b = max(dist_a, key=dist_a.get)
+        dist_b = _hop_distances(self, far_b)
+        lower = dist_a[far_b]
+
+        # Central node: halfway along a shortest path between the two ends of the sweep
+        half = lower // 2
+        center = next(nd for nd in dist_a if dist_a[nd] == half and dist_b[nd] == lower - half)
+        dist_center = _hop_distances(self, center)
+        center_ecc = max(dist_center.values())
+        lower = max(lower, center_ecc)
+        upper = 2 * center_ecc
+
+        fringes = collections.defaultdict(list)
+        for nd, depth in dist_center.items():
+            fringes[depth].append(nd)
+
+        searches = 0
+        level = center_ecc
+        while upper > lower and level > 0:
+            for nd in fringes[level]:
+                if max_bfs is not None and searches >= max_bfs:
+                    return lower, upper, center_ecc
+                searches += 1
+                lower = max(lower, max(_hop_distances(self, nd).values()))
+            # Nodes of lower levels are at most 2 * (level - 1) hops from each other
+            if lower > 2 * (level - 1):
+                upper = lower
             else:
-                layer_nodes = new_layer_nodes
+                upper = max(lower, 2 * (level - 1))
+            level -= 1
+        return lower, upper, center_ecc
+
+    def minimum_spanning_edges(self, algorithm="auto"):
+        """ Finds the links of a minimum spanning forest: a minimum spanning tree for each connected
+        component of the graph. Returns a list of links in the format of get_links().
+            algorithm: "kruskal" (sorts all links and joins components with a union-find structure),
+                       "prim" (grows each tree with a heap of candidate links), or "auto", which uses
+                       Prim for dense graphs and Kruskal otherwise
+        In graphs without weights every link has the same cost and any spanning forest is minimal.
+        """
+        num_nodes = self.size()
+        if algorithm == "auto":
+            dense = num_nodes > 1 and len(self.__targets) >= MST_PRIM_DENSITY * num_nodes * (num_nodes - 1)
+            algorithm = "prim" if dense else "kruskal"
+
+        if algorithm == "kruskal":
+            selected = self.__kruskal()
+        elif algorithm == "prim":
+            selected = self.__prim()
+        else:
+            raise ValueError("Unknown minimum spanning tree algorithm: {}".format(algorithm))
 
-        # Backtrack from destination to initial node to find path
-        current = dest_id
-        node_path = [dest_id]
-        counter = 0
-        while current != init_id and counter < 1000:
-            nbors = self.get_neighbors(current)
+        if self.__weights is not None:
+            return [(self.__node_ids[src], self.__node_ids[self.__targets[p]], self.__weights[p])
+                    for src, p in selected]
+        else:
+            return [(self.__node_ids[src], self.__node_ids[self.__targets[p]]) for src, p in selected]
+
+    def __kruskal(self):
+        """ (Private method) Kruskal's algorithm. Returns the selected links as (source, position) tuples """
+        offsets, targets, weights = self.__offsets, self.__targets, self.__weights
+        num_nodes = self.size()
+
+        # Each link appears twice in the arrays; keep the copy that goes from the lower node number
+        sources = array.array('q', [0]) * len(targets)
+        candidates = []
+        for k in range(num_nodes):
+            for p in range(offsets[k], offsets[k + 1]):
+                sources[p] = k
+                if k < targets[p]:
+                    candidates.append(p)
+        if weights is not None:
+            candidates.sort(key=weights.__getitem__)
+
+        parent = array.array('q', range(num_nodes))
+        rank = bytearray(num_nodes)
+        selected = []
+        for p in candidates:
+            root1, root2 = sources[p], targets[p]
+            while parent[root1] != root1:
+                parent[root1] = parent[parent[root1]]
+                root1 = parent[root1]
+            while parent[root2] != root2:
+                parent[root2] = parent[parent[root2]]
+                root2 = parent[root2]
+            if root1 == root2:
+                continue
+
+            if rank[root1] < rank[root2]:
+                root1, root2 = root2, root1
+            parent[root2] = root1
+            if rank[root1] == rank[root2]:
+                rank[root1] += 1
+            selected.append((sources[p], p))
+            if len(selected) == num_nodes - 1:
+                break
+        return selected
 
-            min_layer = self.size() + 1  # large number that exceeds max layer value
-            best_parent = None
-            for nd in nbors:
-                if vis_map[nd] < min_layer:
-                    min_layer = vis_map[nd]
-                    best_parent = nd
+    def __prim(self):
+        """ (Private method) Prim's algorithm started from every node not yet in a tree. Returns the
+        selected links as (source, position) tuples.
+        """
+        offsets, targets, weights = self.__offsets, self.__targets, self.__weights
+        in_tree = bytearray(self.size())
+        selected = []
+
+        for root in range(self.size()):
+            if in_tree[root]:
+                continue
+            in_tree[root] = 1
+            heap = [(weights[p] if weights is not None else 1, p, root)
+                    for p in range(offsets[root], offsets[root + 1])]
+            heapq.heapify(heap)
+            while heap:
+                _, p, src = heapq.heappop(heap)
+                current = targets[p]
+                if in_tree[current]:
+                    continue
+                in_tree[current] = 1
+                selected.append((src, p))
+                for q in range(offsets[current], offsets[current + 1]):
+                    if not in_tree[targets[q]]:
+                        heapq.heappush(heap, (weights[q] if weights is not None else 1, q, current))
+        return selected
+
+    def triangles(self, node_id=None, processes=1, chunk_size=None, progress=None):
+        """ Counts triangles (groups of three nodes linked to each other). Returns the number of triangles
+        that include a node identified by its ID (None if the node does not exist), or a dictionary with
+        the count of every node if node_id is None.
+            To count the triangles of all nodes, each triangle is enumerated once: links are oriented from
+        the node of lower degree to the node of higher degree, and the oriented neighbor sets of both ends of
+        each link are intersected. The nodes can be split among several worker processes (see
+        betweenness_centrality() for the processes, chunk_size and progress arguments).
+        """
+        if node_id is not None:
+            if self.node_does_not_exist(node_id):
+                return None
+            return self.__node_triangles(self.__index[node_id])
+
+        counts = [0] * self.size()
+        for partial in _run_by_source(self, _triangle_sources, list(range(self.size())), False, processes,
+                                      chunk_size, progress):
+            for k, value in partial.items():
+                counts[k] += value
+        return {self.__node_ids[k]: counts[k] for k in range(self.size())}
+
+    def __node_triangles(self, index):
+        """ (Private method) Counts the triangles of a node by intersecting neighbor sets """
+        nbors = set(self.neighbor_indices(index))
+        nbors.discard(index)
+        count = sum(1 for nb in nbors for nb2 in self.neighbor_indices(nb) if nb2 in nbors)
+        return count // 2
+
+    def local_clustering(self, node_id):
+        """ Returns the local clustering coefficient of a node: the fraction of pairs of its neighbors that
+        are neighbors of each other. Returns None if the node does not exist.
+        """
+        if self.node_does_not_exist(node_id):
+            return None
+        index = self.__index[node_id]
+        degree = len(set(self.neighbor_indices(index)) - {index})
+        if degree < 2:
+            return 0.0
+        return 2.0 * self.__node_triangles(index) / (degree * (degree - 1))
+
+    def average_clustering(self, samples=None, seed=None, processes=1):
+        """ Returns the average of the local clustering coefficients of all nodes. If samples is given,
+        the average is estimated from that number of randomly selected nodes (seed makes the selection
+        reproducible). The exact computation can be split among several worker processes.
+        """
+        if self.size() == 0:
+            return 0.0
+
+        if samples is not None and samples < self.size():
+            rng = random.Random(seed)
+            selected = [rng.randrange(self.size()) for _ in range(samples)]
+            return sum(self.local_clustering(self.__node_ids[k]) for k in selected) / samples
+
+        counts = self.triangles(processes=processes)
+        total = 0.0
+        for nd, count in counts.items():
+            degree = self.__degree(self.__index[nd])
+            if degree > 1:
+                total += 2.0 * count / (degree * (degree - 1))
+        return total / self.size()
+
+    def transitivity(self, samples=None, seed=None, processes=1):
+        """ Returns the global clustering coefficient (transitivity): the fraction of connected triples of
+        nodes (paths of two links) that are closed by a third link. If samples is given, the value is
+        estimated by checking that number of randomly selected triples (seed makes the selection
+        reproducible). The exact computation can be split among several worker processes.
+        """
+        pairs = [self.__degree(k) * (self.__degree(k) - 1) // 2 for k in range(self.size())]
+        total_pairs = sum(pairs)
+        if total_pairs == 0:
+            return 0.0
+
+        if samples is None:
+            closed = sum(self.triangles(processes=processes).values())
+            return float(closed) / total_pairs
+
+        # Select triples uniformly: pick a center node in proportion to its number of neighbor pairs
+        rng = random.Random(seed)
+        cumulative = list(itertools.accumulate(pairs))
+        closed = 0
+        for _ in range(samples):
+            center = bisect.bisect_right(cumulative, rng.randrange(total_pairs))
+            nbors = [nb for nb in set(self.neighbor_indices(center)) if nb != center]
+            nb1, nb2 = rng.sample(nbors, 2)
+            if nb2 in self.neighbor_indices(nb1):
+                closed += 1
+        return float(closed) / samples
+
+    def label_propagation(self, variant="async", weighted=False, max_iter=100, tol=0.0, seed=None, processes=1,
+                          chunk_size=None, as_sets=False):
+        """ Detects communities by label propagation: every node starts with its own label and repeatedly
+        takes the label that is most common (or has the largest total link weight) among its neighbors.
+        Ties keep the current label, or else take the lowest label.
+            variant: "async" updates nodes one at a time in a random order (seed makes the order
+                     reproducible), and every update sees the previous ones. "sync" computes all the new
+                     labels from the labels of the previous iteration; the nodes can then be split in chunks
+                     among several worker processes (see betweenness_centrality() for processes and
+                     chunk_size). The synchronous variant may oscillate on some graphs and then stops at
+                     max_iter.
+            tol: Iterations stop when the fraction of nodes that changed label is not greater than tol
+        Returns a dictionary that maps node IDs to community numbers (0, 1, ...), which can be added as
+        payloads with add_payloads_from_list(result.items()), or a list of sets of node IDs (largest
+        community first) if as_sets is True.
+        """
+        if variant not in ("async", "sync"):
+            raise ValueError("Unknown label propagation variant: {}".format(variant))
+
+        weighted = weighted and self.has_weights()
+        labels = array.array('q', range(self.size()))
+        order = list(range(self.size()))
+        rng = random.Random(seed)
+
+        if variant == "async":
+            for _ in range(max_iter):
+                rng.shuffle(order)
+                changed = 0
+                for node in order:
+                    label = _best_label(self, node, labels, weighted)
+                    if label != labels[node]:
+                        labels[node] = label
+                        changed += 1
+                if changed <= tol * self.size():
+                    break
+            return self.__communities(labels, as_sets)
+
+        # The pool and the shared copy of the graph are reused by all the iterations
+        if chunk_size is None:
+            chunk_size = max(1, self.size() // (4 * max(1, processes)))
+        chunks = [order[pos:pos + chunk_size] for pos in range(0, self.size(), chunk_size)]
+        with _worker_pool(self, processes) as pool:
+            for _ in range(max_iter):
+                tasks = [(functools.partial(_label_sources, labels=labels), chunk, weighted) for chunk in chunks]
+                if pool is None:
+                    results = (_label_sources(self, chunk, weighted, labels) for chunk in chunks)
+                else:
+                    results = (result for _, result in pool.imap_unordered(_run_worker_task, tasks))
+                changes = [change for result in results for change in result]
+                for node, label in changes:
+                    labels[node] = label
+                if len(changes) <= tol * self.size():
+                    break
+        return self.__communities(labels, as_sets)
+
+    def louvain(self, weighted=False, resolution=1.0, tol=1e-7, seed=None, as_sets=False):
+        """ Detects communities with the Louvain method: nodes are moved to the neighboring community that
+        most increases modularity until no move helps, then each community is merged into a single node and
+        the process is repeated on the smaller graph, until the communities do not change.
+            resolution: Values greater than 1 favor smaller communities, values lower than 1 larger ones
+            tol: Minimum increase of modularity for a pass over the nodes to be repeated
+            seed: Makes the order in which nodes are visited reproducible
+        The result has the same form as the result of label_propagation().
+        """
+        weighted = weighted and self.has_weights()
+        rng = random.Random(seed)
+
+        # Level graph: neighbor weights per node and weight of the links inside each node
+        adjacency = []
+        loops = [0.0] * self.size()
+        for node in range(self.size()):
+            nbors = collections.defaultdict(float)
+            for pos in range(self.offsets[node], self.offsets[node + 1]):
+                weight = self.weights[pos] if weighted else 1.0
+                if self.targets[pos] == node:
+                    # A link to itself is stored once and adds its weight once to the strength of the node
+                    # (as in modularity()), so it counts as half of a loop
+                    loops[node] += weight / 2.0
+                else:
+                    nbors[self.targets[pos]] += weight
+            adjacency.append(nbors)
+
+        membership = list(range(self.size()))
+        while True:
+            community, moved = _louvain_move_nodes(adjacency, loops, resolution, tol, rng)
+            if not moved:
+                break
 
-            node_path.append(best_parent)
-            current = best_parent
-            counter += 1
+            numbers = {}
+            for cm in community:
+                numbers.setdefault(cm, len(numbers))
+            membership = [numbers[community[node]] for node in membership]
+
+            merged = [collections.defaultdict(float) for _ in range(len(numbers))]
+            merged_loops = [0.0] * len(numbers)
+            for node, nbors in enumerate(adjacency):
+                cm = numbers[community[node]]
+                merged_loops[cm] += loops[node]
+                for nb, weight in nbors.items():
+                    nb_cm = numbers[community[nb]]
+                    if nb_cm == cm:
+                        merged_loops[cm] += weight / 2.0
+                    else:
+                        merged[cm][nb_cm] += weight
+            adjacency, loops = merged, merged_loops
+
+        return self.__communities(membership, as_sets)
+
+    def modularity(self, communities, weighted=False, resolution=1.0):
+        """ Returns the modularity of a division of the graph into communities, given as a dictionary that
+        maps node IDs to community labels or as a list of sets of node IDs.
+        """
+        if not isinstance(communities, dict):
+            communities = {nd: number for number, group in enumerate(communities) for nd in group}
+        weighted = weighted and self.has_weights()
+
+        internal = collections.defaultdict(float)
+        totals = collections.defaultdict(float)
+        total_weight = 0.0
+        for node in range(self.size()):
+            cm = communities[self.__node_ids[node]]
+            for pos in range(self.offsets[node], self.offsets[node + 1]):
+                weight = self.weights[pos] if weighted else 1.0
+                totals[cm] += weight
+                total_weight += weight
+                if communities[self.__node_ids[self.targets[pos]]] == cm:
+                    internal[cm] += weight
+
+        if total_weight == 0:
+            return 0.0
+        return sum(internal[cm] / total_weight - resolution * (totals[cm] / total_weight) ** 2 for cm in totals)
+
+    def __communities(self, labels, as_sets):
+        """ (Private method) Converts a list of labels by node number into community numbers by node ID
+        (numbered in order of first appearance), or into a list of sets of node IDs.
+        """
+        numbers = {}
+        result = {}
+        for node, label in enumerate(labels):
+            result[self.__node_ids[node]] = numbers.setdefault(label, len(numbers))
+        if not as_sets:
+            return result
+
+        groups = [set() for _ in range(len(numbers))]
+        for nd, number in result.items():
+            groups[number].add(nd)
+        return sorted(groups, key=len, reverse=True)
+
+    def __degree(self, index):
+        """ (Private method) Returns the number of distinct neighbors of a node, ignoring links to itself """
+        nbors = self.neighbor_indices(index)
+        return len(set(nbors)) - (1 if index in nbors else 0)
+
+
+class _SharedPayloads(object):
+    """ Sequence of node payloads stored as json text inside a shared memory buffer. Payloads are
+    decoded when they are requested.
+    """
+
+    def __init__(self, offsets, blob):
+        self.__offsets = offsets
+        self.__blob = blob
+
+    def __len__(self):
+        return len(self.__offsets) - 1
+
+    def __getitem__(self, index):
+        start, end = self.__offsets[index], self.__offsets[index + 1]
+        return None if start == end else json.loads(bytes(self.__blob[start:end]).decode('utf-8'))
+
+
+class SharedGraph(FrozenGraph):
+    """ FrozenGraph whose arrays live in a block of shared memory (multiprocessing.shared_memory), so
+    that several processes can read the same graph without holding their own copy.
+
+    A process publishes a graph once with SharedGraph.publish(graph) and other processes attach to it
+    with SharedGraph.attach(name). Links and weights are read directly from the shared buffer; node IDs
+    are decoded once per attached process and payloads are decoded when requested (payloads must be
+    json-serializable). Every process must call close() when done, and the publishing process must
+    call unlink() to release the shared memory.
+
+    Shared memory layout (all sections aligned to 8 bytes):
+        header | offsets | targets | weights (optional) | payload offsets | node IDs (json) | payloads (json)
+    """
+
+    def __init__(self, shm, owner=False):
+        if shared_memory is None:
+            raise RuntimeError("Shared graphs require multiprocessing.shared_memory (Python 3.8 or newer)")
+
+        self.__shm = shm
+        self.__owner = owner
+        self.__views = []    # memoryviews over the shared buffer, released by close()
+
+        magic, num_nodes, num_targets, has_weights, ids_size, payloads_size = \
+            SHARED_HEADER.unpack_from(shm.buf, 0)
+        if magic != SHARED_MAGIC:
+            raise ValueError("Shared memory block {} does not contain a graph".format(shm.name))
+
+        position = _align(SHARED_HEADER.size)
+        offsets, position = self.__section(position, num_nodes + 1, 'q')
+        targets, position = self.__section(position, num_targets, 'q')
+        weights = None
+        if has_weights:
+            weights, position = self.__section(position, num_targets, 'd')
+        payload_offsets, position = self.__section(position, num_nodes + 1, 'q')
+        ids_blob, position = self.__section(position, ids_size, 'B')
+        payload_blob, position = self.__section(position, payloads_size, 'B')
+
+        node_ids = json.loads(bytes(ids_blob).decode('utf-8'))
+        payloads = _SharedPayloads(payload_offsets, payload_blob)
+        super(SharedGraph, self).__init__(node_ids, offsets, targets, weights, payloads)
+
+    def __section(self, position, count, fmt):
+        """ (Private method) Returns a typed memoryview over count elements of the shared buffer
+        starting at position, and the aligned position of the next section.
+        """
+        nbytes = count * struct.calcsize(fmt)
+        raw = self.__shm.buf[position:position + nbytes]
+        view = raw.cast(fmt)
+        self.__views.extend([view, raw])
+        return view, _align(position + nbytes)
+
+    @classmethod
+    def publish(cls, graph, name=None):
+        """ Copies a Graph (or a FrozenGraph) into a new block of shared memory and returns a SharedGraph
+        that owns it. The name of the block is chosen by the system if no name is given; other processes
+        attach to the graph using that name.
+        """
+        if shared_memory is None:
+            raise RuntimeError("Shared graphs require multiprocessing.shared_memory (Python 3.8 or newer)")
+
+        frozen = graph if isinstance(graph, FrozenGraph) else graph.freeze()
+        node_ids = frozen.get_nodes()
+        ids_blob = json.dumps(list(node_ids), ensure_ascii=False).encode('utf-8')
+
+        payload_offsets = array.array('q', [0])
+        payload_parts = []
+        payload_size = 0
+        for nd in node_ids:
+            pload = frozen.get_payload(nd)
+            if pload is not None:
+                part = json.dumps(pload, ensure_ascii=False).encode('utf-8')
+                payload_parts.append(part)
+                payload_size += len(part)
+            payload_offsets.append(payload_size)
+
+        offsets = array.array('q', frozen.offsets)
+        targets = array.array('q', frozen.targets)
+        sections = [offsets, targets]
+        if frozen.has_weights():
+            sections.append(array.array('d', frozen.weights))
+        sections.extend([payload_offsets, ids_blob, b"".join(payload_parts)])
+
+        total = _align(SHARED_HEADER.size) + sum(_align(len(memoryview(sec).cast('B'))) for sec in sections)
+        shm = shared_memory.SharedMemory(name=name, create=True, size=total)
+        SHARED_HEADER.pack_into(shm.buf, 0, SHARED_MAGIC, len(node_ids), len(targets),
+                                1 if frozen.has_weights() else 0, len(ids_blob), payload_size)
+        position = _align(SHARED_HEADER.size)
+        for sec in sections:
+            raw = memoryview(sec).cast('B')
+            shm.buf[position:position + len(raw)] = raw
+            position = _align(position + len(raw))
+
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        """ Attaches to a graph published in shared memory by another process (identified by name) """
+        if shared_memory is None:
+            raise RuntimeError("Shared graphs require multiprocessing.shared_memory (Python 3.8 or newer)")
+
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:   # Python versions earlier than 3.13 do not have the track argument
+            shm = shared_memory.SharedMemory(name=name)
+            # Without this, the resource tracker of this process deletes the block when the process exits
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return cls(shm, owner=False)
+
+    @property
+    def name(self):
+        """ Name of the shared memory block used to attach to this graph from other processes """
+        return self.__shm.name
+
+    def close(self):
+        """ Detaches this process from the shared memory block. The graph cannot be used afterwards """
+        for view in self.__views:
+            view.release()
+        self.__views = []
+        self.__shm.close()
+
+    def unlink(self):
+        """ Releases the shared memory block. Only the process that published the graph can unlink it """
+        if self.__owner:
+            # Processes that share the resource tracker of this process (such as forked workers) remove the
+            # block from the tracker when they attach; registering it again keeps unlink() from failing there
+            resource_tracker.register(self.__shm._name, "shared_memory")
+            self.__shm.unlink()
+
+
+class PayloadHeuristic(object):
+    """ Base class of A* heuristics that estimate the distance between two nodes from coordinates stored
+    in their payloads. The coordinates are read from the payload entries named in fields (dictionary keys,
+    or positions for payloads that are lists or tuples) and cached per node. Nodes without coordinates get
+    an estimate of zero, which keeps the heuristic admissible.
+
+    Subclasses implement distance(coords_1, coords_2). The result must never exceed the real path length.
+    """
+
+    def __init__(self, graph, fields, scale=1.0):
+        self.__graph = graph
+        self.__fields = fields
+        self.__scale = scale      # multiplies the distance, to express it in the units of the link weights
+        self.__coords = {}        # cache that maps node IDs to coordinates (None if not available)
+
+    def coordinates(self, node_id):
+        """ Returns the coordinates of a node read from its payload, or None if they are not available """
+        if node_id not in self.__coords:
+            payload = self.__graph.get_payload(node_id)
+            try:
+                self.__coords[node_id] = tuple(float(payload[field]) for field in self.__fields)
+            except (KeyError, IndexError, TypeError, ValueError):
+                self.__coords[node_id] = None
+        return self.__coords[node_id]
+
+    def clear_cache(self):
+        """ Forgets the cached coordinates (e.g. after payloads have changed) """
+        self.__coords = {}
+
+    def distance(self, coords_1, coords_2):
+        """ Returns the distance between two points given by their coordinates """
+        raise NotImplementedError
+
+    def __call__(self, node_id, dest_id):
+        coords_1, coords_2 = self.coordinates(node_id), self.coordinates(dest_id)
+        if coords_1 is None or coords_2 is None:
+            return 0.0
+        return self.__scale * self.distance(coords_1, coords_2)
+
+
+class EuclideanHeuristic(PayloadHeuristic):
+    """ A* heuristic that uses the straight-line distance between coordinates stored in node payloads.
+    By default the payloads are dictionaries with 'x' and 'y' entries.
+    """
+
+    def __init__(self, graph, fields=('x', 'y'), scale=1.0):
+        super(EuclideanHeuristic, self).__init__(graph, fields, scale)
+
+    def distance(self, coords_1, coords_2):
+        return math.sqrt(sum((c1 - c2) ** 2 for c1, c2 in zip(coords_1, coords_2)))
+
+
+class HaversineHeuristic(PayloadHeuristic):
+    """ A* heuristic that uses the great-circle distance between latitude and longitude values (in
+    degrees) stored in node payloads. By default the payloads are dictionaries with 'lat' and 'lon'
+    entries and the distance is given in kilometers (radius is the radius of the Earth).
+    """
+
+    def __init__(self, graph, fields=('lat', 'lon'), radius=EARTH_RADIUS_KM, scale=1.0):
+        super(HaversineHeuristic, self).__init__(graph, fields, scale)
+        self.__radius = radius
+
+    def distance(self, coords_1, coords_2):
+        lat1, lon1 = math.radians(coords_1[0]), math.radians(coords_1[1])
+        lat2, lon2 = math.radians(coords_2[0]), math.radians(coords_2[1])
+        hav = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+        return 2 * self.__radius * math.asin(min(1.0, math.sqrt(hav)))
+
+
+class DistanceOracle(object):
+    """ Estimates shortest-path distances between any two nodes using precomputed distances from a small
+    set of landmark nodes. For every landmark L the triangle inequality gives
+        |d(L, a) - d(L, b)| <= d(a, b) <= d(L, a) + d(L, b)
+    so estimate_distance() answers with lower and upper bounds after reading two short rows of distances.
+
+    Distances are computed with BFS (or Dijkstra for graphs with weights when weighted is True) on a
+    snapshot of the graph, so the oracle does not reflect later changes. Landmarks are the nodes with the
+    most links (strategy "degree") or randomly selected nodes (strategy "random", reproducible with seed).
+    Distances are stored node by node in a single flat array (-1 for unreachable landmarks).
+
+    The oracle is also an admissible A* heuristic: oracle(node_id, dest_id) returns the lower bound, so it
+    can be passed to Graph.astar_path() to prune exact searches (the ALT algorithm).
+    """
+
+    def __init__(self, graph, num_landmarks=16, strategy="degree", seed=None, weighted=True):
+        frozen = graph if isinstance(graph, FrozenGraph) else graph.freeze()
+        num_nodes = frozen.size()
+        num_landmarks = min(num_landmarks, num_nodes)
+
+        if strategy == "degree":
+            by_degree = sorted(range(num_nodes), key=lambda k: frozen.offsets[k + 1] - frozen.offsets[k],
+                               reverse=True)
+            landmarks = by_degree[:num_landmarks]
+        elif strategy == "random":
+            landmarks = random.Random(seed).sample(range(num_nodes), num_landmarks)
+        else:
+            raise ValueError("Unknown landmark selection strategy: {}".format(strategy))
+
+        weighted = weighted and frozen.has_weights()
+        distances = array.array('d', [-1.0]) * (num_nodes * num_landmarks)
+        for col, landmark in enumerate(landmarks):
+            for k, value in enumerate(_single_source_distances(frozen, landmark, weighted)):
+                distances[k * num_landmarks + col] = value
+
+        self.__setup(list(frozen.get_nodes()), [frozen.node_at(k) for k in landmarks], distances)
+
+    def __setup(self, node_ids, landmarks, distances):
+        """ (Private method) Sets the oracle data """
+        self.__node_ids = node_ids
+        self.__index = {nd: k for k, nd in enumerate(node_ids)}
+        self.__landmarks = landmarks
+        self.__distances = distances     # row k holds the distances from node k to every landmark
+
+    @classmethod
+    def load_json(cls, filepath):
+        """ Loads an oracle saved by save_json() from the file whose path is given by filepath """
+        with open(filepath, "r") as jf:
+            saved = json.load(jf)
+        oracle = cls.__new__(cls)
+        oracle.__setup(saved['node_ids'], saved['landmarks'], array.array('d', saved['distances']))
+        return oracle
+
+    def save_json(self, filepath):
+        """ Saves the oracle (json format) to the file whose path is given by filepath, e.g. next to the
+        file of the graph saved with Graph.save_json().
+        """
+        with open(filepath, "w") as jf:
+            json.dump({'node_ids': self.__node_ids, 'landmarks': self.__landmarks,
+                       'distances': self.__distances.tolist()}, jf, ensure_ascii=False)
 
-        # Return reversed path
-        return node_path[::-1]
+    def get_landmarks(self):
+        """ Returns the list of landmark nodes """
+        return self.__landmarks
+
+    def landmark_distances(self, node_id):
+        """ Returns the list of distances from a node to each landmark (-1 for unreachable landmarks), or
+        None if the node is not known by the oracle.
+        """
+        k = self.__index.get(node_id)
+        if k is None:
+            return None
+        width = len(self.__landmarks)
+        return self.__distances[k * width:(k + 1) * width].tolist()
+
+    def estimate_distance(self, init_id, dest_id):
+        """ Returns a tuple (lower, upper) with bounds of the shortest-path distance between two nodes.
+        Both bounds are infinite if the nodes are in different components, the upper bound is infinite if
+        no landmark reaches both nodes, and the result is None if a node is not known by the oracle.
+        """
+        k1, k2 = self.__index.get(init_id), self.__index.get(dest_id)
+        if k1 is None or k2 is None:
+            return None
+        if k1 == k2:
+            return 0.0, 0.0
+
+        width = len(self.__landmarks)
+        distances = self.__distances
+        lower, upper = 0.0, INFINITY
+        for col in range(width):
+            dist1, dist2 = distances[k1 * width + col], distances[k2 * width + col]
+            if dist1 < 0 and dist2 < 0:
+                continue
+            if dist1 < 0 or dist2 < 0:
+                return INFINITY, INFINITY    # a landmark reaches only one of the nodes
+            lower = max(lower, abs(dist1 - dist2))
+            upper = min(upper, dist1 + dist2)
+        return lower, upper
+
+    def __call__(self, node_id, dest_id):
+        bounds = self.estimate_distance(node_id, dest_id)
+        return 0.0 if bounds is None or bounds[0] == INFINITY else bounds[0]
+
+
+def _astar_search(init_id, dest_id, heuristic, links, stats):
+    """ Runs an A* search from init_id to dest_id. The links function returns (next_id, cost) tuples for
+    a node and the heuristic estimates the remaining cost from a node to dest_id. Heuristic values are
+    computed once per node. Returns the list of nodes in the path (an empty list if dest_id cannot be
+    reached) and fills the optional stats dictionary.
+    """
+    estimates = {}      # heuristic cache for this search
+    parent = {init_id: None}
+    cost = {init_id: 0}
+    settled = set()
+    counter = itertools.count()     # breaks ties between nodes with IDs that cannot be compared
+    heap = [(0, next(counter), init_id)]
+    pushed = 1
+
+    while heap:
+        _, _, current = heapq.heappop(heap)
+        if current in settled:
+            continue
+        settled.add(current)
+        if current == dest_id:
+            break
+
+        for nb, link_cost in links(current):
+            new_cost = cost[current] + link_cost
+            if nb not in settled and (nb not in cost or new_cost < cost[nb]):
+                cost[nb] = new_cost
+                parent[nb] = current
+                if nb not in estimates:
+                    estimates[nb] = heuristic(nb, dest_id) if heuristic is not None else 0
+                heapq.heappush(heap, (new_cost + estimates[nb], next(counter), nb))
+                pushed += 1
+
+    if stats is not None:
+        stats['expanded'] = len(settled)
+        stats['pushed'] = pushed
+        stats['heuristic_calls'] = len(estimates)
+        stats['cost'] = cost.get(dest_id) if dest_id in settled else None
+
+    if dest_id not in settled:
+        return []
+
+    node_path = [dest_id]
+    while parent[node_path[-1]] is not None:
+        node_path.append(parent[node_path[-1]])
+    return node_path[::-1]
+
+
+class _PayloadIndex(object):
+    """ Base class of the secondary indexes over node payloads. The indexed value of a payload is the
+    payload entry named field (for dictionaries, lists and tuples) or the result of a key function.
+    Payloads without the entry, or for which the key function returns None, are not indexed.
+    """
+
+    def __init__(self, field=None, key=None):
+        self.__field = field
+        self.__key = key
+
+    def value_of(self, payload):
+        """ Returns the indexed value of a payload, or None if the payload is not indexed """
+        if payload is None:
+            return None
+        try:
+            return self.__key(payload) if self.__key is not None else payload[self.__field]
+        except (KeyError, IndexError, TypeError):
+            return None
+
+    def clear(self):
+        """ Removes all entries of the index """
+        raise NotImplementedError
+
+    def build(self, items):
+        """ Replaces all entries of the index with the nodes of an iterable of (node_id, payload) tuples.
+        Returns the number of payloads that have an indexed value.
+        """
+        self.clear()
+        count = 0
+        for node_id, payload in items:
+            if self.value_of(payload) is not None:
+                self.add(node_id, payload)
+                count += 1
+        return count
+
+    def add(self, node_id, payload):
+        """ Adds a node to the index using the value of its payload """
+        raise NotImplementedError
+
+    def remove(self, node_id, payload):
+        """ Removes a node from the index using the value of its (previous) payload """
+        raise NotImplementedError
+
+    def find(self, value):
+        """ Returns the set of nodes whose indexed value is equal to value """
+        raise NotImplementedError
+
+
+class _HashPayloadIndex(_PayloadIndex):
+    """ Payload index that maps each value with the set of nodes that have it (equality lookups) """
+
+    def __init__(self, field=None, key=None):
+        super(_HashPayloadIndex, self).__init__(field, key)
+        self.__nodes = {}
+
+    def clear(self):
+        self.__nodes = {}
+
+    def add(self, node_id, payload):
+        value = self.value_of(payload)
+        if value is not None:
+            try:
+                self.__nodes.setdefault(value, set()).add(node_id)
+            except TypeError:   # values that cannot be hashed are not indexed
+                pass
+
+    def remove(self, node_id, payload):
+        value = self.value_of(payload)
+        try:
+            bucket = self.__nodes.get(value)
+        except TypeError:
+            return
+        if bucket is not None:
+            bucket.discard(node_id)
+            if len(bucket) == 0:
+                del self.__nodes[value]
+
+    def find(self, value):
+        try:
+            return set(self.__nodes.get(value, ()))
+        except TypeError:
+            return set()
+
+
+class _SortedPayloadIndex(_PayloadIndex):
+    """ Payload index that keeps values sorted, for equality and range lookups. Values must be comparable
+    to each other; payloads with values that cannot be compared are not indexed.
+    """
+
+    def __init__(self, field=None, key=None):
+        super(_SortedPayloadIndex, self).__init__(field, key)
+        self.__values = []      # sorted indexed values
+        self.__nodes = []       # node of each element of the values list
+
+    def clear(self):
+        self.__values = []
+        self.__nodes = []
+
+    def build(self, items):
+        # Values are sorted once instead of being inserted one at a time
+        pairs = []
+        for node_id, payload in items:
+            value = self.value_of(payload)
+            if value is not None:
+                pairs.append((value, node_id))
+        try:
+            pairs.sort(key=lambda pair: pair[0])
+        except TypeError:
+            # Values that cannot be compared to each other are skipped one at a time, as in add()
+            self.clear()
+            for value, node_id in pairs:
+                self.__insert(node_id, value)
+            return len(pairs)
+
+        self.__values = [pair[0] for pair in pairs]
+        self.__nodes = [pair[1] for pair in pairs]
+        return len(pairs)
+
+    def add(self, node_id, payload):
+        value = self.value_of(payload)
+        if value is not None:
+            self.__insert(node_id, value)
+
+    def __insert(self, node_id, value):
+        """ (Private method) Inserts a node in its sorted position, unless its value cannot be compared """
+        try:
+            pos = bisect.bisect_right(self.__values, value)
+        except TypeError:
+            return
+        self.__values.insert(pos, value)
+        self.__nodes.insert(pos, node_id)
+
+    def remove(self, node_id, payload):
+        value = self.value_of(payload)
+        if value is None:
+            return
+        try:
+            start = bisect.bisect_left(self.__values, value)
+            end = bisect.bisect_right(self.__values, value)
+        except TypeError:
+            return
+        for pos in range(start, end):
+            if self.__nodes[pos] == node_id:
+                del self.__values[pos]
+                del self.__nodes[pos]
+                return
+
+    def find(self, value):
+        return self.find_range(value, value)
+
+    def find_range(self, low=None, high=None):
+        """ Returns the set of nodes whose indexed value v satisfies low <= v <= high. A bound that is None
+        is not applied.
+        """
+        start = 0 if low is None else bisect.bisect_left(self.__values, low)
+        end = len(self.__values) if high is None else bisect.bisect_right(self.__values, high)
+        return set(self.__nodes[start:end])
+
+
+def _node_order_key(node_id):
+    """ Returns a key that orders node IDs of any type: by type name first, then by value """
+    return type(node_id).__name__, node_id
+
+
+def _k_hop_expand(seeds, k, max_size, hub_degree, neighbors, degree=None):
+    """ Expands the neighborhoods of several seed nodes together, one layer at a time. The neighbors of
+    a node are read once per layer (with the neighbors function) and shared by all the seeds whose frontier
+    contains the node. Returns one dictionary per seed that maps reached nodes to their depth.
+        max_size: Maximum number of nodes in a neighborhood (including the seed)
+        hub_degree: Nodes with more neighbors than this value are included but not expanded (seeds are
+                    always expanded)
+        degree: Optional function that returns the number of neighbors of a node without reading them,
+                used to skip hubs before their links are read
+    """
+    reached = [{seed: 0} for seed in seeds]
+    frontier = collections.defaultdict(list)     # maps frontier nodes with the seeds that reached them
+    for pos, seed in enumerate(seeds):
+        frontier[seed].append(pos)
+
+    for depth in range(1, k + 1):
+        new_frontier = collections.defaultdict(list)
+        for nd, seed_positions in frontier.items():
+            if depth > 1 and hub_degree is not None and degree is not None and degree(nd) > hub_degree:
+                continue
+            nbors = neighbors(nd)
+            if depth > 1 and hub_degree is not None and len(nbors) > hub_degree:
+                continue
+            for pos in seed_positions:
+                seed_reached = reached[pos]
+                for nb in nbors:
+                    if max_size is not None and len(seed_reached) >= max_size:
+                        break
+                    if nb not in seed_reached:
+                        seed_reached[nb] = depth
+                        new_frontier[nb].append(pos)
+        if len(new_frontier) == 0:
+            break
+        frontier = new_frontier
+
+    return reached
+
+
+def _shortest_path_dag(graph, source, weighted):
+    """ Runs a single-source shortest path search (BFS, or Dijkstra if weighted is True and the graph has
+    weights) on a FrozenGraph. Returns the node numbers in order of non-decreasing distance, and lists
+    with the number of shortest paths, the predecessors and the distance of every node (-1 if unreachable).
+    """
+    num_nodes = graph.size()
+    offsets, targets = graph.offsets, graph.targets
+    weights = graph.weights if weighted else None
+
+    order = []
+    sigma = [0] * num_nodes
+    preds = [[] for _ in range(num_nodes)]
+    dist = [-1] * num_nodes
+    sigma[source] = 1
+    dist[source] = 0
+
+    if weights is None:
+        queue = collections.deque([source])
+        while queue:
+            current = queue.popleft()
+            order.append(current)
+            next_dist = dist[current] + 1
+            for p in range(offsets[current], offsets[current + 1]):
+                nb = targets[p]
+                if dist[nb] < 0:
+                    dist[nb] = next_dist
+                    queue.append(nb)
+                if dist[nb] == next_dist:
+                    sigma[nb] += sigma[current]
+                    preds[nb].append(current)
+    else:
+        done = bytearray(num_nodes)
+        heap = [(0, source, source)]
+        while heap:
+            current_dist, current, parent = heapq.heappop(heap)
+            if done[current]:
+                # Another shortest path of the same length reaches an already settled node
+                if current_dist == dist[current] and parent != current:
+                    sigma[current] += sigma[parent]
+                    preds[current].append(parent)
+                continue
+            done[current] = 1
+            dist[current] = current_dist
+            if parent != current:
+                sigma[current] = sigma[parent]
+                preds[current] = [parent]
+            order.append(current)
+            for p in range(offsets[current], offsets[current + 1]):
+                nb = targets[p]
+                if not done[nb]:
+                    heapq.heappush(heap, (current_dist + weights[p], nb, current))
+
+    return order, sigma, preds, dist
+
+
+class RandomWalker(object):
+    """ Generates random walks over an array-backed copy of a graph. Walks are produced in chunks, and
+    all the walks of a chunk advance one step at a time (in lockstep).
+        mode: "uniform" (every neighbor is equally likely), "weighted" (neighbors are chosen in proportion
+              to link weights, using precomputed alias tables) or "node2vec" (weighted steps biased by the
+              previous node: returning has weight 1/p, moving to a neighbor of the previous node has weight 1,
+              and moving away has weight 1/q; implemented by rejection sampling)
+        seed: Seed for reproducible walks. Each chunk uses its own seed derived from it, so the same walks
+              are produced with any number of worker processes.
+    Graphs without weights use unit weights in the "weighted" and "node2vec" modes.
+
+    The walker keeps a FrozenGraph with the neighbors of each node sorted, so that node2vec can test
+    whether two nodes are neighbors with a binary search. Its weights hold the alias tables, each entry
+    packed as (alias position << ALIAS_BITS) + acceptance probability scaled to ALIAS_BITS bits (exact in a
+    float for nodes with fewer than 2**29 links), which lets worker processes share the whole walker state
+    through a single SharedGraph.
+    """
+
+    def __init__(self, graph, mode="uniform", p=1.0, q=1.0, seed=None):
+        if mode not in ("uniform", "weighted", "node2vec"):
+            raise ValueError("Unknown random walk mode: {}".format(mode))
+
+        frozen = graph if isinstance(graph, FrozenGraph) else graph.freeze()
+        self.__mode = mode
+        self.__p = p
+        self.__q = q
+        self.__seed = seed
+
+        offsets = array.array('q', frozen.offsets)
+        targets = array.array('q')
+        use_weights = mode != "uniform" and frozen.has_weights()
+        weights = array.array('d') if use_weights else None
+        for k in range(frozen.size()):
+            start, end = frozen.offsets[k], frozen.offsets[k + 1]
+            positions = sorted(range(start, end), key=frozen.targets.__getitem__)
+            targets.extend(frozen.targets[pos] for pos in positions)
+            if use_weights:
+                weights.extend(frozen.weights[pos] for pos in positions)
+
+        alias = self.__build_alias_tables(offsets, weights) if use_weights else None
+        self.__graph = FrozenGraph(list(frozen.get_nodes()), offsets, targets, alias)
+
+    @staticmethod
+    def __build_alias_tables(offsets, weights):
+        """ (Private method) Builds an alias table for the links of every node (Vose's method), which allows
+        choosing a neighbor in proportion to link weights in constant time. Returns the packed entries.
+        """
+        scale = 1 << ALIAS_BITS
+        alias = array.array('d', [0.0]) * len(weights)
+        for k in range(len(offsets) - 1):
+            start, end = offsets[k], offsets[k + 1]
+            degree = end - start
+            total = sum(weights[start:end])
+            if degree == 0 or total <= 0:
+                for i in range(degree):
+                    alias[start + i] = i << ALIAS_BITS    # a zero acceptance always picks the alias: itself
+                continue
+
+            scaled = [weights[pos] * degree / total for pos in range(start, end)]
+            small = [i for i in range(degree) if scaled[i] < 1.0]
+            large = [i for i in range(degree) if scaled[i] >= 1.0]
+            while small and large:
+                less, more = small.pop(), large.pop()
+                alias[start + less] = (more << ALIAS_BITS) + min(scale - 1, max(0, int(scaled[less] * scale)))
+                scaled[more] -= 1.0 - scaled[less]
+                (small if scaled[more] < 1.0 else large).append(more)
+            for i in small + large:
+                alias[start + i] = i << ALIAS_BITS
+        return alias
+
+    def walk_chunk(self, start_nodes, walk_length, seed=None):
+        """ Generates one walk of walk_length nodes from each start node (walks stop early at nodes without
+        links). Returns a list of walks, each walk being a list of node IDs.
+        """
+        return _walk_chunk(self.__graph, start_nodes, walk_length, seed, self.__mode == "node2vec",
+                           self.__p, self.__q)
+
+    def __walk_tasks(self, start_nodes, walk_length, walks_per_node, chunk_size):
+        """ (Private method) Yields the arguments of _walk_chunk() (except the graph) for each chunk of
+        walks, one chunk at a time.
+        """
+        master = random.Random(self.__seed)
+        starts = (nd for _ in range(walks_per_node) for nd in start_nodes if self.__graph.node_exists(nd))
+        while True:
+            chunk = list(itertools.islice(starts, chunk_size))
+            if len(chunk) == 0:
+                return
+            yield chunk, walk_length, master.getrandbits(64), self.__mode == "node2vec", self.__p, self.__q
+
+    def walks(self, start_nodes=None, walk_length=80, walks_per_node=1, chunk_size=DEFAULT_WALK_CHUNK,
+              processes=1):
+        """ Generates walks_per_node walks of walk_length nodes from each start node (all nodes by default).
+        Walks are yielded in chunks (lists of at most chunk_size walks) as they are produced, so they can
+        be written out without holding all of them in memory. With more than one process, chunks are
+        produced by a pool of worker processes that attach to the walker arrays in shared memory, and are
+        yielded in order. At most WALK_TASKS_PER_PROCESS chunks per process are requested ahead of the
+        chunk being yielded, so memory does not grow when chunks are consumed slowly.
+        """
+        if start_nodes is None:
+            start_nodes = self.__graph.get_nodes()
+        tasks = self.__walk_tasks(start_nodes, walk_length, walks_per_node, chunk_size)
+
+        with _worker_pool(self.__graph, processes) as pool:
+            if pool is None:
+                for task in tasks:
+                    yield _walk_chunk(self.__graph, *task)
+                return
+
+            pending = collections.deque(pool.apply_async(_run_walk_task, (task,))
+                                        for task in itertools.islice(tasks, processes * WALK_TASKS_PER_PROCESS))
+            while pending:
+                result = pending.popleft().get()
+                for task in itertools.islice(tasks, 1):
+                    pending.append(pool.apply_async(_run_walk_task, (task,)))
+                yield result
+
+
+def _walk_chunk(graph, start_nodes, walk_length, seed, node2vec, p, q):
+    """ Generates one walk of walk_length nodes from each start node over the sorted links and packed alias
+    tables (graph weights) of a FrozenGraph prepared by RandomWalker. Returns the walks as lists of node IDs.
+    """
+    offsets, targets, alias = graph.offsets, graph.targets, graph.weights
+    rng = random.Random(seed)
+    max_bias = max(1.0 / p, 1.0, 1.0 / q)
+
+    def first_order_step(node):
+        # Chooses a neighbor of a node (uniformly or using its alias table)
+        start = offsets[node]
+        pick = int(rng.random() * (offsets[node + 1] - start))
+        if alias is not None:
+            entry = int(alias[start + pick])
+            if rng.getrandbits(ALIAS_BITS) >= entry & ALIAS_MASK:
+                pick = entry >> ALIAS_BITS
+        return targets[start + pick]
+
+    def are_neighbors(node_1, node_2):
+        # Tests if two nodes are neighbors with a binary search
+        start, end = offsets[node_1], offsets[node_1 + 1]
+        pos = bisect.bisect_left(targets, node_2, start, end)
+        return pos < end and targets[pos] == node_2
+
+    current = [graph.index_of(nd) for nd in start_nodes]
+    previous = [-1] * len(current)
+    walks = [[nd] for nd in current]
+    active = [w for w in range(len(current)) if offsets[current[w]] < offsets[current[w] + 1]]
+
+    for _ in range(walk_length - 1):
+        still_active = []
+        for w in active:
+            node = current[w]
+            if node2vec and previous[w] >= 0:
+                while True:
+                    candidate = first_order_step(node)
+                    if candidate == previous[w]:
+                        bias = 1.0 / p
+                    elif are_neighbors(previous[w], candidate):
+                        bias = 1.0
+                    else:
+                        bias = 1.0 / q
+                    if rng.random() * max_bias < bias:
+                        break
+            else:
+                candidate = first_order_step(node)
+
+            previous[w] = node
+            current[w] = candidate
+            walks[w].append(candidate)
+            if offsets[candidate] < offsets[candidate + 1]:
+                still_active.append(w)
+        active = still_active
+        if len(active) == 0:
+            break
+
+    node_ids = graph.get_nodes()
+    return [[node_ids[k] for k in walk] for walk in walks]
+
+
+def _run_walk_task(task):
+    """ Generates a chunk of random walks in a worker process over the graph prepared by a RandomWalker """
+    return _walk_chunk(_worker_graph, *task)
+
+
+def _single_source_distances(graph, source, weighted):
+    """ Returns a list with the distance from a source node to every node of a FrozenGraph (-1 for
+    unreachable nodes), computed with BFS, or with Dijkstra if weighted is True.
+    """
+    offsets, targets, weights = graph.offsets, graph.targets, graph.weights
+    dist = [-1] * graph.size()
+
+    if not weighted:
+        dist[source] = 0
+        queue = collections.deque([source])
+        while queue:
+            current = queue.popleft()
+            for nb in targets[offsets[current]:offsets[current + 1]]:
+                if dist[nb] < 0:
+                    dist[nb] = dist[current] + 1
+                    queue.append(nb)
+        return dist
+
+    heap = [(0, source)]
+    while heap:
+        current_dist, current = heapq.heappop(heap)
+        if dist[current] >= 0:
+            continue
+        dist[current] = current_dist
+        for p in range(offsets[current], offsets[current + 1]):
+            if dist[targets[p]] < 0:
+                heapq.heappush(heap, (current_dist + weights[p], targets[p]))
+    return dist
+
+
+def _betweenness_sources(graph, sources, weighted):
+    """ Returns the betweenness scores accumulated from a group of source nodes (Brandes' algorithm) """
+    scores = [0.0] * graph.size()
+    for source in sources:
+        order, sigma, preds, _ = _shortest_path_dag(graph, source, weighted)
+        delta = [0.0] * graph.size()
+        while order:
+            current = order.pop()
+            coeff = (1.0 + delta[current]) / sigma[current]
+            for parent in preds[current]:
+                delta[parent] += sigma[parent] * coeff
+            if current != source:
+                scores[current] += delta[current]
+    return scores
+
+
+def _triangle_sources(graph, sources, weighted):
+    """ Counts the triangles found from a group of nodes of a FrozenGraph. Every triangle is found once,
+    from its node of lowest rank, where nodes are ranked by (degree, node number). Returns a dictionary
+    that maps node numbers to their partial triangle counts.
+    """
+    offsets, targets = graph.offsets, graph.targets
+    counts = collections.defaultdict(int)
+    oriented = {}   # neighbors of higher rank of each node, built once per task
+
+    def higher(node):
+        if node not in oriented:
+            rank = (offsets[node + 1] - offsets[node], node)
+            oriented[node] = set(nb for nb in targets[offsets[node]:offsets[node + 1]]
+                                 if (offsets[nb + 1] - offsets[nb], nb) > rank)
+        return oriented[node]
+
+    for node in sources:
+        node_higher = higher(node)
+        for nb in node_higher:
+            for nb2 in node_higher.intersection(higher(nb)):
+                counts[node] += 1
+                counts[nb] += 1
+                counts[nb2] += 1
+    return counts
+
+
+def _best_label(graph, node, labels, weighted):
+    """ Returns the label with the largest count (or total link weight) among the neighbors of a node of a
+    FrozenGraph. Ties keep the current label of the node, or else take the lowest label.
+    """
+    offsets, targets, weights = graph.offsets, graph.targets, graph.weights
+    scores = collections.defaultdict(float)
+    for pos in range(offsets[node], offsets[node + 1]):
+        if targets[pos] != node:
+            scores[labels[targets[pos]]] += weights[pos] if weighted else 1.0
+    if len(scores) == 0:
+        return labels[node]
+
+    best = max(scores.values())
+    if scores.get(labels[node]) == best:
+        return labels[node]
+    return min(label for label, score in scores.items() if score == best)
+
+
+def _label_sources(graph, sources, weighted, labels):
+    """ Computes the new labels of a group of nodes for synchronous label propagation. Returns a list of
+    (node, label) tuples for the nodes whose label changes.
+    """
+    changes = []
+    for node in sources:
+        label = _best_label(graph, node, labels, weighted)
+        if label != labels[node]:
+            changes.append((node, label))
+    return changes
+
+
+def _louvain_move_nodes(adjacency, loops, resolution, tol, rng):
+    """ Local moving phase of the Louvain method on a graph given as a list of {neighbor: weight}
+    dictionaries and the weights of links inside each node. Returns the community of every node and
+    whether any node was moved.
+    """
+    size = len(adjacency)
+    strength = [sum(nbors.values()) + 2.0 * loops[node] for node, nbors in enumerate(adjacency)]
+    total_weight = sum(strength)
+    community = list(range(size))
+    if total_weight == 0:
+        return community, False
+
+    totals = list(strength)
+    order = list(range(size))
+    moved = False
+    while True:
+        rng.shuffle(order)
+        gain = 0.0
+        for node in order:
+            current = community[node]
+            links = collections.defaultdict(float)
+            for nb, weight in adjacency[node].items():
+                links[community[nb]] += weight
+
+            totals[current] -= strength[node]
+            factor = resolution * strength[node] / total_weight
+            best, best_value = current, links[current] - factor * totals[current]
+            for cm, weight in links.items():
+                value = weight - factor * totals[cm]
+                if value > best_value:
+                    best, best_value = cm, value
+            totals[best] += strength[node]
+
+            if best != current:
+                community[node] = best
+                gain += 2.0 * (best_value - (links[current] - factor * totals[current])) / total_weight
+                moved = True
+        if gain <= tol:
+            return community, moved
+
+
+def _hop_distances(graph, source):
+    """ Returns a dictionary with the number of hops from a source node to every node of a FrozenGraph
+    that it can reach (breadth-first search).
+    """
+    offsets, targets = graph.offsets, graph.targets
+    dist = {source: 0}
+    queue = collections.deque([source])
+    while queue:
+        current = queue.popleft()
+        for nb in targets[offsets[current]:offsets[current + 1]]:
+            if nb not in dist:
+                dist[nb] = dist[current] + 1
+                queue.append(nb)
+    return dist
+
+
+def _eccentricity_sources(graph, sources, weighted):
+    """ Returns a list of (source, eccentricity) tuples for a group of source nodes of a FrozenGraph. The
+    sources are processed in batches of ECCENTRICITY_BATCH with a single breadth-first search per batch,
+    where bit j of the integer kept for a node means that the node has been reached by source j.
+    """
+    offsets, targets = graph.offsets, graph.targets
+    result = []
+    for pos in range(0, len(sources), ECCENTRICITY_BATCH):
+        batch = sources[pos:pos + ECCENTRICITY_BATCH]
+        seen = collections.defaultdict(int)
+        frontier = {}
+        for j, source in enumerate(batch):
+            seen[source] |= 1 << j
+            frontier[source] = frontier.get(source, 0) | 1 << j
+
+        ecc = [0] * len(batch)
+        depth = 0
+        while frontier:
+            depth += 1
+            next_frontier = collections.defaultdict(int)
+            reached = 0
+            for node, bits in frontier.items():
+                for nb in targets[offsets[node]:offsets[node + 1]]:
+                    new_bits = bits & ~seen[nb]
+                    if new_bits:
+                        seen[nb] |= new_bits
+                        next_frontier[nb] |= new_bits
+                        reached |= new_bits
+            while reached:
+                lowest = reached & -reached
+                ecc[lowest.bit_length() - 1] = depth
+                reached ^= lowest
+            frontier = next_frontier
+
+        result.extend(zip(batch, ecc))
+    return result
+
+
+def _closeness_sources(graph, sources, weighted):
+    """ Returns a list of (source, closeness) tuples for a group of source nodes """
+    num_nodes = graph.size()
+    result = []
+    for source in sources:
+        _, _, _, dist = _shortest_path_dag(graph, source, weighted)
+        reachable = [value for value in dist if value > 0]
+        total = sum(reachable)
+        if total > 0 and num_nodes > 1:
+            result.append((source, len(reachable) / total * len(reachable) / (num_nodes - 1)))
+        else:
+            result.append((source, 0.0))
+    return result
+
+
+def _run_by_source(graph, function, sources, weighted, processes, chunk_size, progress):
+    """ Splits a list of source nodes into chunks and yields function(graph, chunk, weighted) for each chunk.
+    With more than one process, the chunks are processed by a pool of workers that attach to a copy of the
+    graph in shared memory (or receive a copy of the graph if shared memory is not available).
+    """
+    weighted = weighted and graph.has_weights()
+    if chunk_size is None:
+        chunk_size = max(1, len(sources) // (4 * max(1, processes)))
+    chunks = [sources[pos:pos + chunk_size] for pos in range(0, len(sources), chunk_size)]
+    done = 0
+
+    if processes <= 1:
+        for chunk in chunks:
+            result = function(graph, chunk, weighted)
+            done += len(chunk)
+            if progress is not None:
+                progress(done, len(sources))
+            yield result
+        return
+
+    with _worker_pool(graph, processes) as pool:
+        tasks = [(function, chunk, weighted) for chunk in chunks]
+        for count, result in pool.imap_unordered(_run_worker_task, tasks):
+            done += count
+            if progress is not None:
+                progress(done, len(sources))
+            yield result
+
+
+@contextlib.contextmanager
+def _worker_pool(graph, processes):
+    """ Context manager that yields a pool of worker processes that attach to a copy of a FrozenGraph in
+    shared memory (or receive a copy of the graph if shared memory is not available). Yields None if
+    processes is not greater than 1.
+    """
+    if processes <= 1:
+        yield None
+        return
+
+    shared = None
+    if shared_memory is not None:
+        shared = graph if isinstance(graph, SharedGraph) else SharedGraph.publish(graph)
+    try:
+        graph_source = graph if shared is None else shared.name
+        with multiprocessing.Pool(processes, initializer=_init_worker, initargs=(graph_source,)) as pool:
+            yield pool
+    finally:
+        if shared is not None and shared is not graph:
+            shared.close()
+            shared.unlink()
+
+
+_worker_graph = None    # FrozenGraph (or SharedGraph) used by the tasks of a worker process
+
+
+def _init_worker(graph_source):
+    """ Initializes a worker process with a FrozenGraph, or with the name of a SharedGraph to attach to """
+    global _worker_graph
+    _worker_graph = SharedGraph.attach(graph_source) if isinstance(graph_source, str) else graph_source
+
+
+def _run_worker_task(task):
+    """ Runs a task (function, sources, weighted) in a worker process. Returns the number of processed
+    sources and the task result.
+    """
+    function, sources, weighted = task
+    return len(sources), function(_worker_graph, sources, weighted)
+
+
+def _align(position):
+    """ Rounds a byte position up to the next multiple of 8 """
+    return (position + 7) // 8 * 8
 
 
 if __name__ == "__main__":
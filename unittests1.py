@@ -4,7 +4,16 @@ Running tests from command line requires:
      python unittest1.py
 """
 
+import io
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
 import unittest
+from xml.etree import ElementTree
 import graflib as glib
 
 
@@ -416,6 +425,718 @@ class TestGraflib(unittest.TestCase):
         res9 = tgr.shortest_path(0, 9)
         self.assertEqual(len(res9), 5, "Shortest path for node 9 has 5 nodes")
 
+    def test_sqlite_storage(self):
+        gr = glib.Graph(has_weights=True, storage=glib.SQLiteStorage(cache_size=3))
+
+        gr.add_nodes_from_list([k for k in range(7)])
+        gr.add_links_from_list([(0, 3, 0.3), (0, 2, 0.2), (2, 4, 2.4), (0, 1, 0.1), (1, 5, 1.5),
+                                (5, 4, 5.4), (5, 6, 5.6), (3, 4, 3.4), (1, 6, 1.6)])
+        gr.add_payload(5, {'first': 'bob', 'last': 'harris'})
+
+        self.assertEqual(gr.size(), 7, "Graph backed by SQLite should report 7 nodes")
+        self.assertIn((1, 5, 1.5), gr.get_links(1), "(1, 5, 1.5) should be listed as a link for Node 1")
+        self.assertEqual(set(gr.get_neighbors(5)), {1, 4, 6}, "Node 5 should have neighbors 1, 4 and 6")
+        self.assertEqual(gr.get_payload(5)['last'], 'harris', "Payload of node 5 should be recovered from SQLite")
+        self.assertEqual(len(gr.bfs_traverse(0)), 7, "BFS result should return all 7 nodes")
+        self.assertEqual(gr.shortest_path(0, 6), [0, 1, 6], "Shortest path for node 6 should be [0, 1, 6]")
+        self.assertEqual(len(gr.get_nodes()), 7, "Node list of graph backed by SQLite should have 7 nodes")
+
+        gr.remove_node(5)
+        self.assertEqual(gr.size(), 6, "Graph backed by SQLite should report 6 nodes after a removal")
+        self.assertNotIn(5, gr.get_neighbors(1), "Node 5 should NOT be listed as neighbor of 1")
+
+        gr.add_link(0, 3, 0.9)
+        self.assertEqual(gr.storage().get_near(0), {(3, 0.9), (2, 0.2), (1, 0.1)},
+                         "A new weight should replace the cached link from 0 to 3")
+        gr.close()
+
+        # Traversals and paths must not depend on the recursion limit or on the length of the path
+        path = glib.Graph(storage=glib.SQLiteStorage(cache_size=100))
+        with path.batch():
+            path.add_nodes_from_list(range(3000))
+            path.add_links_from_list([(k, k + 1) for k in range(2999)])
+        self.assertEqual(path.bfs_traverse(0), list(range(3000)), "BFS should visit the 3000 nodes in order")
+        self.assertEqual(path.dfs_traverse(2999), list(range(2999, -1, -1)), "DFS should visit the 3000 nodes")
+        self.assertEqual(path.shortest_path(0, 2999), list(range(3000)), "Path from 0 to 2999 has 3000 nodes")
+        path.close()
+
+    def test_sqlite_storage_persistence(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            db_path = os.path.join(tmp_dir, "graph.db")
+
+            gr = glib.Graph(storage=glib.SQLiteStorage(db_path, cache_size=2))
+            with gr.batch():
+                gr.add_nodes_from_list(['a', 'b', 'c', 'd'])
+                gr.add_links_from_list([('a', 'b'), ('b', 'c'), ('c', 'd')])
+            gr.add_payload('a', [1, 2, 3])
+            self.assertLessEqual(gr.storage().cached_nodes(), 2, "LRU cache should hold at most 2 lists")
+            gr.close()
+
+            gr2 = glib.Graph(storage=glib.SQLiteStorage(db_path))
+            self.assertEqual(gr2.size(), 4, "Reopened graph should report 4 nodes")
+            self.assertTrue(gr2.are_neighbors('c', 'd'), "Reopened graph should keep the link between 'c' and 'd'")
+            self.assertEqual(gr2.get_payload('a'), [1, 2, 3], "Reopened graph should keep the payload of 'a'")
+            self.assertEqual(gr2.shortest_path('a', 'd'), ['a', 'b', 'c', 'd'], "Path from 'a' to 'd' has 4 nodes")
+            gr2.close()
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_relinking_on_every_backend(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            json_path = os.path.join(tmp_dir, "graph.json")
+            gr = glib.Graph(has_weights=True)
+            gr.add_nodes_from_list([0, 1, 2])
+            gr.save_json(json_path)
+
+            lazy = glib.Graph(has_weights=True)
+            lazy.load_json(json_path, lazy=True)
+            sqlite = glib.Graph(has_weights=True, storage=glib.SQLiteStorage(cache_size=1))
+            sqlite.add_nodes_from_list([0, 1, 2])
+
+            for backend in (gr, lazy, sqlite):
+                backend.add_link(0, 1, 1.0)
+                backend.add_link(0, 1, 2.0)
+                backend.add_link(1, 2, 1.2)
+                self.assertEqual(backend.get_links(0), [(0, 1, 2.0)], "Linking again should replace the weight")
+                self.assertEqual(backend.degree(1), 2, "Linking again should not add a second link")
+                self.assertEqual(backend.remove_link_between_nodes(1, 0), 1, "The replaced link should be removed")
+                self.assertEqual(backend.get_links(1), [(1, 2, 1.2)], "Node 1 should only link to 2")
+                self.assertEqual(backend.degree(0), 0, "Node 0 should have no links after the removal")
+            lazy.close()
+            sqlite.close()
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_frozen_graph(self):
+        frozen = self.gr_ww_7.freeze()
+
+        self.assertEqual(frozen.size(), 7, "Frozen graph should report 7 nodes")
+        self.assertTrue(frozen.has_weights(), "Frozen copy of a graph with weights should have weights")
+        self.assertEqual(set(frozen.get_links(1)), set(self.gr_ww_7.get_links(1)), "Links of node 1 should match")
+        self.assertEqual(frozen.get_payload(3), 103, "Payload of node 3 should be 103")
+        self.assertEqual(set(frozen.dfs_traverse(0)), set(range(7)), "DFS result should return all 7 nodes")
+        self.assertEqual(set(frozen.bfs_traverse(0)), set(range(7)), "BFS result should return all 7 nodes")
+        self.assertEqual(len(frozen.shortest_path(0, 6)), 3, "Shortest path for node 6 has 3 nodes")
+        self.assertEqual(set(frozen.get_depth_layer(0, 2)['nodes']), {4, 5, 6}, "Layer 2 should have nodes 4, 5, 6")
+
+        self.gr_ww_7.remove_node(6)
+        self.assertEqual(frozen.size(), 7, "Frozen graph should not reflect later changes")
+
+    def test_shared_graph(self):
+        published = glib.SharedGraph.publish(self.gr_ww_7)
+        try:
+            attached = glib.SharedGraph.attach(published.name)
+
+            self.assertEqual(attached.size(), 7, "Attached graph should report 7 nodes")
+            self.assertEqual(set(attached.get_links(5)), set(self.gr_ww_7.get_links(5)), "Links of 5 should match")
+            self.assertEqual(attached.get_payload(2), 102, "Payload of node 2 should be 102")
+            self.assertIsNone(attached.get_payload(6), "Node 6 should not have a payload")
+            self.assertEqual(len(attached.shortest_path(3, 6)), 4, "Shortest path from 3 to 6 has 4 nodes")
+            self.assertTrue(attached.is_node_in_layer(0, 5, 2), "Node 5 should be in layer 2 from node 0")
+            self.assertEqual(set(attached.bfs_traverse(6)), set(range(7)), "BFS result should return all 7 nodes")
+            attached.close()
+
+            # A process that attaches and exits must leave the block available to other processes
+            script = "import graflib; gr = graflib.SharedGraph.attach({!r}); print(gr.size()); gr.close()"
+            for _ in range(2):
+                output = subprocess.check_output([sys.executable, "-c", script.format(published.name)],
+                                                 cwd=os.path.dirname(os.path.abspath(glib.__file__)))
+                self.assertEqual(output.strip(), b"7", "Another process should attach to the graph with 7 nodes")
+        finally:
+            published.close()
+            published.unlink()
+
+    def test_save_and_load_json(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            json_path = os.path.join(tmp_dir, "graph.json")
+            self.gr_ww_7.save_json(json_path)
+
+            gr = glib.Graph(has_weights=True)
+            gr.load_json(json_path)
+            self.assertEqual(set(gr.get_nodes()), set(range(7)), "Loaded graph should keep integer node IDs")
+            self.assertIn((1, 5, 1.5), gr.get_links(1), "(1, 5, 1.5) should be listed as a link for Node 1")
+            self.assertEqual(gr.get_payload(3), 103, "Payload of node 3 should be 103")
+
+            mixed = glib.Graph()
+            for nd in (1, "1", 2):
+                mixed.add_node(nd)
+            mixed.add_link(1, "1")
+            mixed.add_link(2, 1)
+            mixed.save_json(json_path)
+            for lazy in (False, True):
+                gr = glib.Graph()
+                gr.load_json(json_path, lazy=lazy)
+                self.assertEqual(set(gr.get_nodes()), {1, "1", 2}, "Nodes 1 and '1' should both be kept")
+                self.assertEqual(set(gr.get_neighbors(1)), {"1", 2}, "Node 1 should keep neighbors '1' and 2")
+                self.assertEqual(gr.freeze().size(), 3, "Loaded graph should freeze with 3 nodes")
+                gr.close()
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_journal_recovery(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            journal_path = os.path.join(tmp_dir, "graph.journal")
+            snapshot_path = os.path.join(tmp_dir, "graph.json")
+
+            gr = self.gr_ww_7
+            gr.open_journal(journal_path, snapshot_path)
+            self.assertTrue(os.path.exists(snapshot_path), "Opening a journal should write a first snapshot")
+
+            gr.add_node(7)
+            gr.add_link(6, 7, 6.7)
+            gr.remove_node(2)
+            gr.add_payload(7, {'first': 'bob', 'last': 'harris'})
+            gr.remove_payload(0)
+            self.assertFalse(gr.checkpoint(), "A small batch of changes should not compact the journal")
+            gr.close_journal()
+
+            rgr = glib.Graph(has_weights=True)
+            replayed = rgr.recover(snapshot_path, journal_path)
+            self.assertGreater(replayed, 0, "Recovery should replay the journal records")
+            self.assertEqual(set(rgr.get_nodes()), set(gr.get_nodes()), "Recovered graph should have the same nodes")
+            for nd in gr.get_nodes():
+                self.assertEqual(set(rgr.get_links(nd)), set(gr.get_links(nd)), "Links of {} should match".format(nd))
+                self.assertEqual(rgr.get_payload(nd), gr.get_payload(nd), "Payload of {} should match".format(nd))
+
+            rgr.open_journal(journal_path, snapshot_path)
+            self.assertTrue(rgr.checkpoint(force=True), "A forced checkpoint should compact the journal")
+            rgr.close_journal()
+            self.assertEqual(os.path.getsize(journal_path), 0, "The journal should be empty after compaction")
+            self.assertFalse(os.path.exists(snapshot_path + ".tmp"), "The temporary snapshot should be renamed")
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_lazy_load_json(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            json_path = os.path.join(tmp_dir, "graph.json")
+            self.gr_ww_7.add_node('odd "name" {x}\\')
+            self.gr_ww_7.add_link(6, 'odd "name" {x}\\', 9.9)
+            self.gr_ww_7.save_json(json_path, pretty=True)
+
+            gr = glib.Graph(has_weights=True)
+            gr.load_json(json_path, lazy=True, cache_size=2)
+            self.assertTrue(os.path.exists(json_path + glib.INDEX_SUFFIX), "Loading should create a sidecar index")
+            self.assertEqual(gr.size(), 8, "Lazy graph should report 8 nodes")
+            self.assertEqual(gr.storage().cached_nodes(), 0, "No node should be materialized after loading")
+
+            self.assertEqual(set(gr.get_neighbors(5)), {1, 4, 6}, "Node 5 should have neighbors 1, 4 and 6")
+            self.assertEqual(gr.get_payload(1), 101, "Payload of node 1 should be 101")
+            self.assertIn((6, 'odd "name" {x}\\', 9.9), gr.get_links(6), "Node 6 should link to the odd name")
+            self.assertEqual(len(gr.shortest_path(3, 6)), 4, "Shortest path from 3 to 6 has 4 nodes")
+            self.assertLessEqual(gr.storage().cached_nodes(), 2, "At most 2 nodes should be materialized")
+
+            gr.add_node(20)
+            gr.add_link(20, 0, 2.0)
+            gr.remove_node(3)
+            self.assertEqual(gr.size(), 8, "Lazy graph should report 8 nodes after changes")
+            self.assertIn(20, gr.get_neighbors(0), "Node 20 should be listed as neighbor of 0")
+            self.assertFalse(gr.node_exists(3), "Node 3 should not exist after removal")
+            gr.close()
+
+            gr2 = glib.Graph(has_weights=True)
+            gr2.load_json(json_path, lazy=True)
+            self.assertEqual(set(gr2.get_nodes()), set(self.gr_ww_7.get_nodes()), "Sidecar index should be reused")
+            gr2.close()
+
+            gr3 = glib.Graph(has_weights=True)
+            gr3.load_json(json_path, lazy=True, cache_size=0)
+            self.assertEqual(gr3.add_link(3, 4, 1.0), 1, "A node can be changed when nothing is cached")
+            self.assertIn((3, 4, 1.0), gr3.get_links(3), "The change should be kept without a cache")
+            gr3.close()
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_pagerank(self):
+        gr = glib.Graph(has_weights=True)
+        gr.add_nodes_from_list([k for k in range(6)])
+        gr.add_links_from_list([(0, 1, 1.0), (0, 2, 1.0), (0, 3, 1.0), (0, 4, 1.0), (4, 5, 10.0)])
+
+        res = gr.pagerank(tol=1.0e-10)
+        self.assertAlmostEqual(sum(res.values()), 1.0, 6, msg="PageRank scores should add up to 1")
+        self.assertAlmostEqual(res[1], res[2], 9, msg="Symmetric nodes 1 and 2 should have the same PageRank")
+
+        unweighted = gr.pagerank(tol=1.0e-10, weighted=False)
+        self.assertEqual(max(unweighted, key=unweighted.get), 0, "The hub (node 0) should have the highest PageRank")
+        self.assertGreater(res[5], unweighted[5], "The heavy link to node 5 should raise its weighted PageRank")
+
+        warm = gr.pagerank(tol=1.0e-10, start=res)
+        for nd in res:
+            self.assertAlmostEqual(warm[nd], res[nd], 6, msg="Warm start should converge to the same scores")
+
+        personal = gr.pagerank(personalization=[5])
+        self.assertEqual(max(personal, key=personal.get), 5, "Seed node 5 should rank first in personalized PageRank")
+
+    def test_eigenvector_centrality(self):
+        res = self.gr_ww_7.eigenvector_centrality(tol=1.0e-10, weighted=False)
+        self.assertAlmostEqual(sum(value * value for value in res.values()), 1.0, 6,
+                               msg="Eigenvector centrality scores should have unit length")
+        self.assertGreater(res[0], res[6], "Node 0 should be more central than node 6")
+
+    def test_betweenness_centrality(self):
+        gr = glib.Graph(has_weights=True)
+        gr.add_nodes_from_list([k for k in range(6)])
+        gr.add_links_from_list([(0, 1, 1), (1, 2, 1), (2, 3, 1), (0, 4, 5), (4, 3, 1), (3, 5, 2)])
+
+        res1 = gr.betweenness_centrality(weighted=False, normalized=False)
+        self.assertEqual(res1, {0: 1.0, 1: 1.0, 2: 2.0, 3: 5.0, 4: 2.0, 5: 0.0},
+                         "Unweighted betweenness should count the shortest paths through each node")
+
+        res2 = gr.betweenness_centrality()
+        self.assertAlmostEqual(res2[4], 0.0, 9, msg="The heavy links of node 4 should keep it off shortest paths")
+        self.assertAlmostEqual(res2[1], 0.4, 9, msg="Node 1 should be on 4 of 10 weighted shortest paths")
+
+        reported = []
+        res3 = gr.betweenness_centrality(processes=2, chunk_size=2,
+                                         progress=lambda done, total: reported.append((done, total)))
+        for nd in res2:
+            self.assertAlmostEqual(res3[nd], res2[nd], 9, msg="Parallel betweenness should match for {}".format(nd))
+        self.assertEqual(reported[-1], (6, 6), "Progress should report all 6 sources as processed")
+
+        res4 = gr.betweenness_centrality(samples=3, seed=7)
+        self.assertEqual(len(res4), 6, "Sampled betweenness should report a score for each node")
+
+    def test_closeness_centrality(self):
+        gr = glib.Graph()
+        gr.add_nodes_from_list(['a', 'b', 'c', 'd'])
+        gr.add_links_from_list([('a', 'b'), ('b', 'c')])
+
+        res = gr.closeness_centrality()
+        self.assertAlmostEqual(res['b'], 2.0 / 3.0, 9, msg="Node 'b' reaches 2 of 3 nodes at distance 1")
+        self.assertAlmostEqual(res['a'], 2.0 / 3.0 * 2.0 / 3.0, 9, msg="Node 'a' reaches 2 nodes at distance 1 and 2")
+        self.assertEqual(res['d'], 0.0, "An isolated node should have zero closeness")
+        self.assertEqual(gr.closeness_centrality(processes=2), res, "Parallel closeness should give the same scores")
+
+    def test_k_hop_neighborhoods(self):
+        ngr = glib.Graph()
+        ngr.add_nodes_from_list([k for k in range(10)])
+        ngr.add_links_from_list([(0, 1), (0, 2), (0, 3), (1, 6), (1, 5), (2, 4), (5, 6)])
+        ngr.add_links_from_list([(3, 4), (6, 7), (5, 8), (4, 8), (4, 9), (9, 8), (4, 5)])
+
+        for source in [ngr, ngr.freeze()]:
+            res = source.k_hop_neighborhoods([0, 7, 42], 2)
+            self.assertEqual(res[0], {0: 0, 1: 1, 2: 1, 3: 1, 4: 2, 5: 2, 6: 2},
+                             "The 2-hop neighborhood of node 0 should have nodes up to layer 2")
+            self.assertEqual(res[7], {7: 0, 6: 1, 1: 2, 5: 2}, "The 2-hop neighborhood of node 7 has 4 nodes")
+            self.assertEqual(res[42], {}, "A seed that does not exist should have an empty neighborhood")
+
+            res = source.k_hop_neighborhoods([0], 3, max_size=5)
+            self.assertEqual(len(res[0]), 5, "The neighborhood of node 0 should be capped at 5 nodes")
+
+            res = source.k_hop_neighborhoods([9], 2, hub_degree=3)
+            self.assertEqual(res[9], {9: 0, 4: 1, 8: 1, 5: 2}, "Expansion should not continue through hub node 4")
+
+    def test_astar_path(self):
+        # Grid of 10 x 10 nodes with coordinates in the payloads and links of length 1
+        gr = glib.Graph(has_weights=True)
+        for row in range(10):
+            for col in range(10):
+                gr.add_node((row, col))
+                gr.add_payload((row, col), {'x': col, 'y': row})
+        for row in range(10):
+            for col in range(10):
+                if col < 9:
+                    gr.add_link((row, col), (row, col + 1), 1.0)
+                if row < 9:
+                    gr.add_link((row, col), (row + 1, col), 1.0)
+
+        stats_blind = {}
+        res1 = gr.astar_path((0, 0), (0, 9), stats=stats_blind)
+        self.assertEqual(len(res1), 10, "Path from (0, 0) to (0, 9) should have 10 nodes")
+
+        stats_guided = {}
+        res2 = gr.astar_path((0, 0), (0, 9), glib.EuclideanHeuristic(gr), stats_guided)
+        self.assertEqual(len(res2), 10, "A* path from (0, 0) to (0, 9) should have 10 nodes")
+        self.assertEqual(stats_guided['cost'], 9.0, "A* path cost should be 9")
+        self.assertLess(stats_guided['expanded'], stats_blind['expanded'],
+                        "The Euclidean heuristic should reduce the number of expanded nodes")
+
+        gr.remove_link_between_nodes((0, 4), (0, 5))
+        res3 = gr.astar_path((0, 0), (0, 9), glib.EuclideanHeuristic(gr))
+        self.assertEqual(len(res3), 12, "The detour around the removed link should add 2 nodes")
+
+        # Several paths from 0 to 4 have two links, and any of them may be returned
+        res4 = self.gr_nw_5.astar_path(0, 4)
+        self.assertEqual(len(res4), 3, "Unweighted A* path from 0 to 4 should have 3 nodes")
+        self.assertTrue(self.gr_nw_5.are_neighbors(res4[0], res4[1]) and self.gr_nw_5.are_neighbors(res4[1], 4),
+                        "Consecutive nodes of the A* path should be linked")
+        self.assertEqual(self.gr_nw_5.astar_path(0, 42), [], "A path to a missing node should be empty")
+
+    def test_haversine_heuristic(self):
+        gr = glib.Graph(has_weights=True)
+        gr.add_nodes_from_list(['paris', 'london', 'nowhere'])
+        gr.add_payload('paris', {'lat': 48.8566, 'lon': 2.3522})
+        gr.add_payload('london', {'lat': 51.5074, 'lon': -0.1278})
+
+        heuristic = glib.HaversineHeuristic(gr)
+        self.assertAlmostEqual(heuristic('paris', 'london'), 343.5, 0, "Paris and London are about 343 km apart")
+        self.assertEqual(heuristic('paris', 'nowhere'), 0.0, "Nodes without coordinates should get a zero estimate")
+
+    def test_minimum_spanning_tree(self):
+        gr = self.gr_ww_7
+        gr.add_nodes_from_list([7, 8, 9])
+        gr.add_links_from_list([(7, 8, 1.0), (8, 9, 2.0), (7, 9, 0.5)])
+
+        for algorithm in ["kruskal", "prim", "auto"]:
+            links = gr.minimum_spanning_tree(algorithm, as_graph=False)
+            self.assertEqual(len(links), 8, "A spanning forest of 10 nodes in 2 components should have 8 links")
+            self.assertAlmostEqual(sum(link[2] for link in links), 7.6, 9,
+                                   msg="Minimum spanning forest ({}) should have a cost of 7.6".format(algorithm))
+
+        forest = gr.minimum_spanning_tree()
+        self.assertEqual(forest.size(), 10, "The spanning forest should keep all 10 nodes")
+        self.assertTrue(forest.are_neighbors(7, 9), "The cheapest link (7, 9) should be in the forest")
+        self.assertFalse(forest.are_neighbors(8, 9), "The most expensive link (8, 9) should not be in the forest")
+        self.assertEqual(len(list(forest.iter_links())), 8, "The spanning forest should have 8 links")
+
+    def test_triangles_and_clustering(self):
+        gr = glib.Graph()
+        gr.add_nodes_from_list(['a', 'b', 'c', 'd', 'e'])
+        gr.add_links_from_list([('a', 'b'), ('b', 'c'), ('a', 'c'), ('c', 'd'), ('b', 'd'), ('d', 'e')])
+
+        expected = {'a': 1, 'b': 2, 'c': 2, 'd': 1, 'e': 0}
+        self.assertEqual(gr.triangles(), expected, "Triangle counts should match for all nodes")
+        self.assertEqual(gr.triangles(processes=2), expected, "Parallel triangle counts should match")
+        self.assertEqual(gr.triangles('b'), 2, "Node 'b' should be part of 2 triangles")
+        self.assertIsNone(gr.triangles('z'), "A missing node should have no triangle count")
+
+        self.assertAlmostEqual(gr.local_clustering('a'), 1.0, 9, msg="The neighbors of 'a' are all linked")
+        self.assertAlmostEqual(gr.local_clustering('d'), 1.0 / 3.0, 9, msg="One of 3 neighbor pairs of 'd' is linked")
+        self.assertAlmostEqual(gr.average_clustering(), (1.0 + 2.0 / 3.0 + 2.0 / 3.0 + 1.0 / 3.0) / 5.0, 9,
+                               msg="Average clustering should be the mean of the local coefficients")
+        self.assertAlmostEqual(gr.transitivity(), 6.0 / 10.0, 9, msg="6 of 10 connected triples are closed")
+
+        approx = gr.transitivity(samples=2000, seed=3)
+        self.assertAlmostEqual(approx, 0.6, 1, msg="Sampled transitivity should be close to 0.6")
+
+    def test_degree_index(self):
+        gr = self.gr_ww_7
+        self.assertEqual(gr.degree(5), 3, "Node 5 should have 3 links")
+        self.assertIsNone(gr.degree(42), "A missing node should have no degree")
+        self.assertEqual(gr.degree_histogram(), [0, 0, 3, 4], "3 nodes should have 2 links and 4 nodes 3 links")
+        self.assertEqual(set(nd for nd, _ in gr.top_k_by_degree(4)), {0, 1, 4, 5}, "Nodes 0, 1, 4, 5 have 3 links")
+        self.assertEqual(set(gr.nodes_with_degree_between(0, 2)), {2, 3, 6}, "Nodes 2, 3 and 6 have 2 links")
+
+        gr.add_node(7)
+        gr.add_links_from_list([(7, 0, 1.0), (7, 1, 1.0), (7, 5, 1.0), (7, 6, 1.0)])
+        gr.remove_link_between_nodes(0, 3)
+        gr.remove_node(1)
+        for nd in gr.get_nodes():
+            self.assertEqual(gr.degree(nd), len(gr.get_links(nd)), "Degree index should match node {}".format(nd))
+        self.assertEqual(set(gr.nodes_with_degree_between(3, 10)), {4, 5, 7}, "Nodes 4, 5 and 7 should have 3 links")
+        self.assertEqual(sum(gr.degree_histogram()), gr.size(), "The histogram should count every node")
+
+    def test_degree_index_on_storage(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            db_path = os.path.join(tmp_dir, "graph.db")
+            json_path = os.path.join(tmp_dir, "graph.json")
+            gr = glib.Graph(storage=glib.SQLiteStorage(db_path))
+            gr.add_nodes_from_list(['a', 'b', 'c', 'd'])
+            gr.add_links_from_list([('a', 'b'), ('a', 'c'), ('a', 'd')])
+            gr.save_json(json_path)
+            gr.close()
+
+            gr2 = glib.Graph(storage=glib.SQLiteStorage(db_path))
+            self.assertEqual(gr2.top_k_by_degree(1), [('a', 3)], "Reopened SQLite graph should index degrees")
+            gr2.add_link('a', 'b')
+            gr2.remove_link_between_nodes('a', 'c')
+            self.assertEqual(gr2.degree('a'), 2, "Linking already linked nodes should not change the degree")
+            self.assertEqual(gr2.degree('c'), 0, "Node c should have no links after the removal")
+            gr2.close()
+
+            gr3 = glib.Graph()
+            gr3.load_json(json_path, lazy=True)
+            self.assertEqual(gr3.degree('b'), 1, "Lazy graph should index degrees")
+            self.assertEqual(gr3.storage().cached_nodes(), 0, "Indexing degrees should not materialize nodes")
+            gr3.close()
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_distance_oracle(self):
+        tgr = glib.Graph()
+        tgr.add_nodes_from_list([k for k in range(12)])
+        tgr.add_links_from_list([(0, 1), (0, 2), (0, 3), (1, 4), (2, 4), (2, 5), (3, 5), (3, 7), (4, 6), (5, 6), (6, 7)])
+        tgr.add_links_from_list([(4, 8), (6, 8), (6, 9), (8, 9), (10, 11)])
+
+        oracle = glib.DistanceOracle(tgr, num_landmarks=3)
+        self.assertEqual(len(oracle.get_landmarks()), 3, "The oracle should use 3 landmarks")
+        for init_id in range(10):
+            for dest_id in range(10):
+                exact = len(tgr.shortest_path(init_id, dest_id)) - 1
+                lower, upper = oracle.estimate_distance(init_id, dest_id)
+                self.assertLessEqual(lower, exact, "Lower bound should not exceed the distance")
+                self.assertGreaterEqual(upper, exact, "Upper bound should not be below the distance")
+
+        self.assertEqual(oracle.estimate_distance(0, 10)[0], float("inf"), "Nodes 0 and 10 are not connected")
+        self.assertIsNone(oracle.estimate_distance(0, 42), "A missing node should have no estimate")
+
+        stats_blind, stats_alt = {}, {}
+        tgr.astar_path(0, 9, stats=stats_blind)
+        path = tgr.astar_path(0, 9, oracle, stats_alt)
+        self.assertEqual(len(path), 5, "A* guided by the oracle should find the shortest path")
+        self.assertLessEqual(stats_alt['expanded'], stats_blind['expanded'], "The oracle should prune the search")
+
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            oracle_path = os.path.join(tmp_dir, "oracle.json")
+            oracle.save_json(oracle_path)
+            loaded = glib.DistanceOracle.load_json(oracle_path)
+            self.assertEqual(loaded.estimate_distance(1, 9), oracle.estimate_distance(1, 9),
+                             "A loaded oracle should give the same estimates")
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_payload_indexes(self):
+        gr = glib.Graph()
+        gr.add_nodes_from_list([k for k in range(6)])
+        gr.add_links_from_list([(0, 1), (1, 2), (2, 3), (3, 4), (4, 5), (0, 5)])
+        gr.add_payloads_from_list([(0, {'first': 'bob', 'last': 'harris', 'age': 31}),
+                                   (1, {'first': 'ann', 'last': 'lee', 'age': 25}),
+                                   (2, {'first': 'bob', 'last': 'lee', 'age': 47}),
+                                   (3, {'first': 'eve', 'last': 'cole', 'age': 38})])
+
+        self.assertEqual(gr.create_payload_index('first'), 4, "4 payloads should be indexed by first name")
+        gr.create_payload_index('age', kind="sorted")
+        gr.create_payload_index(key=lambda pload: pload['last'].upper(), name='upper_last')
+
+        self.assertEqual(gr.find_nodes(first='bob'), {0, 2}, "Nodes 0 and 2 should have first name bob")
+        self.assertEqual(gr.find_nodes(first='bob', upper_last='LEE'), {2}, "Only node 2 is bob lee")
+        self.assertEqual(gr.find_nodes(last='lee'), {1, 2}, "Conditions without an index should scan payloads")
+        self.assertEqual(gr.find_nodes_in_range('age', 30, 40), {0, 3}, "Nodes 0 and 3 are between 30 and 40")
+        self.assertEqual(gr.find_nodes_in_range('age', low=40), {2}, "Only node 2 is older than 40")
+
+        gr.add_payload(4, {'first': 'bob', 'last': 'stone', 'age': 35})
+        gr.remove_payload(0)
+        gr.remove_node(2)
+        self.assertEqual(gr.find_nodes(first='bob'), {4}, "Indexes should follow payload and node changes")
+        self.assertEqual(gr.find_nodes_in_range('age', 30, 40), {3, 4}, "Nodes 3 and 4 are between 30 and 40")
+
+        allowed = gr.find_nodes_in_range('age') | {5}
+        self.assertEqual(set(gr.bfs_traverse(5, restrict_to=allowed)), {5, 4, 3},
+                         "BFS restricted to indexed nodes should stop at node 2 (removed) and node 0")
+        self.assertEqual(set(gr.dfs_traverse(5, restrict_to=allowed)), {5, 4, 3},
+                         "DFS restricted to indexed nodes should visit nodes 5, 4 and 3")
+
+        gr.add_payload(5, {'age': 'unknown'})
+        gr.create_payload_index('age', kind="sorted", name='mixed_age')
+        self.assertEqual(gr.find_nodes_in_range('mixed_age', 30, 40), {3, 4},
+                         "Values that cannot be compared should be skipped when building a sorted index")
+
+    def test_random_walks(self):
+        gr = self.gr_ww_7
+        chunks = list(gr.random_walks(walk_length=6, walks_per_node=3, seed=7, chunk_size=5))
+        walks = [walk for chunk in chunks for walk in chunk]
+        self.assertEqual(len(walks), 21, "Three walks should start at each of the 7 nodes")
+        self.assertTrue(all(len(chunk) <= 5 for chunk in chunks), "Chunks should hold at most 5 walks")
+        for walk in walks:
+            self.assertEqual(len(walk), 6, "Every node has links, so walks should have 6 nodes")
+            for a, b in zip(walk, walk[1:]):
+                self.assertTrue(b in gr.get_neighbors(a), "Consecutive nodes of a walk should be linked")
+
+        again = [walk for chunk in gr.random_walks(walk_length=6, walks_per_node=3, seed=7, chunk_size=5)
+                 for walk in chunk]
+        self.assertEqual(walks, again, "Walks with the same seed should be identical")
+
+        gr = glib.Graph(has_weights=True)
+        for k in range(3):
+            gr.add_node(k)
+        gr.add_link(0, 1, 1000.0)
+        gr.add_link(0, 2, 0.001)
+        walker = glib.RandomWalker(gr, mode="weighted", seed=1)
+        steps = [walk[1] for walk in walker.walk_chunk([0] * 200, 2, seed=3)]
+        self.assertGreater(steps.count(1), 190, "Weighted walks should almost always take the heavy link")
+
+        walker = glib.RandomWalker(gr, mode="node2vec", p=0.001, q=1.0, seed=1)
+        walks = walker.walk_chunk([1] * 50, 3, seed=3)
+        self.assertTrue(all(walk == [1, 0, 1] for walk in walks), "A low p should make walks return")
+
+        isolated = glib.Graph()
+        isolated.add_node(0)
+        self.assertEqual(list(isolated.random_walks(walk_length=5)), [[[0]]], "Walks stop at isolated nodes")
+        self.assertRaises(ValueError, glib.RandomWalker, gr, "biased")
+
+    def test_random_walks_in_processes(self):
+        serial = list(self.gr_ww_7.random_walks(walk_length=5, walks_per_node=2, mode="weighted", seed=5,
+                                                chunk_size=4))
+        parallel = list(self.gr_ww_7.random_walks(walk_length=5, walks_per_node=2, mode="weighted", seed=5,
+                                                  chunk_size=4, processes=2))
+        self.assertEqual(serial, parallel, "Walks should not depend on the number of processes")
+
+        # Chunks are requested as they are consumed, so a caller can stop after the first chunk
+        walks = self.gr_ww_7.random_walks(walk_length=5, walks_per_node=1000, seed=5, chunk_size=2, processes=2)
+        self.assertEqual(len(next(walks)), 2, "The first chunk should hold 2 walks")
+        walks.close()
+
+    def two_cliques(self, weights=False):
+        """ Two groups of four fully linked nodes joined by a single link (3-4) """
+        gr = glib.Graph(has_weights=weights)
+        for k in range(8):
+            gr.add_node(k)
+        for group in ([0, 1, 2, 3], [4, 5, 6, 7]):
+            for a in group:
+                for b in group:
+                    if a < b:
+                        gr.add_link(a, b, 2.0)
+        gr.add_link(3, 4, 0.5)
+        return gr
+
+    def test_label_propagation(self):
+        gr = self.two_cliques()
+        expected = [{0, 1, 2, 3}, {4, 5, 6, 7}]
+        for variant in ("async", "sync"):
+            groups = gr.label_propagation(variant=variant, seed=3, as_sets=True)
+            self.assertEqual(sorted(groups, key=min), expected, "Each clique should be a community")
+
+        labels = gr.label_propagation(seed=3)
+        self.assertEqual(sorted(set(labels.values())), [0, 1], "Communities should be numbered 0 and 1")
+        self.assertEqual(gr.add_payloads_from_list(labels.items()), 8, "Labels should be usable as payloads")
+        self.assertEqual(gr.get_payload(0), gr.get_payload(3), "Nodes 0 and 3 are in the same community")
+
+        parallel = gr.label_propagation(variant="sync", processes=2, as_sets=True)
+        self.assertEqual(sorted(parallel, key=min), expected, "Parallel updates should give the same communities")
+        self.assertRaises(ValueError, gr.label_propagation, "random")
+
+    def test_louvain(self):
+        gr = self.two_cliques(weights=True)
+        groups = gr.louvain(weighted=True, seed=1, as_sets=True)
+        self.assertEqual(sorted(groups, key=min), [{0, 1, 2, 3}, {4, 5, 6, 7}], "Each clique should be a community")
+        self.assertAlmostEqual(gr.modularity(groups, weighted=True), 2 * (24.0 / 49.0 - (24.5 / 49.0) ** 2),
+                               msg="Modularity should match the formula", delta=1e-9)
+        self.assertGreater(gr.modularity(groups), gr.modularity([set(range(8))]),
+                           "Two communities should have higher modularity than one")
+
+        part = gr.subgraph(groups[0] | {99})
+        self.assertEqual(part.size(), 4, "The subgraph should have the 4 existing nodes of the community")
+        self.assertEqual(len(list(part.iter_links())), 6, "The subgraph should keep the 6 links of the clique")
+        self.assertEqual(part.get_links(0)[0][2], 2.0, "The subgraph should keep link weights")
+
+        gr.add_link(0, 0, 1.0)
+        self.assertIn((0, 0, 1.0), gr.subgraph([0, 1]).get_links(0), "The subgraph should keep links to itself")
+
+    def test_diameter_and_eccentricity(self):
+        gr = glib.Graph()
+        for k in [0, 1, 2, 3, 4, 10, 11, 12, 20]:
+            gr.add_node(k)
+        gr.add_links_from_list([(0, 1), (1, 2), (2, 3), (3, 4), (10, 11), (11, 12), (12, 10)])
+
+        self.assertEqual(gr.connected_components(), [{0, 1, 2, 3, 4}, {10, 11, 12}, {20}],
+                         "The graph should have three components, largest first")
+        self.assertEqual(gr.eccentricity(0), 4, "Node 0 is 4 hops away from node 4")
+        self.assertEqual(gr.eccentricity(2), 2, "Node 2 is in the middle of the path")
+        self.assertEqual(gr.eccentricity(99), None, "A missing node has no eccentricity")
+        self.assertEqual(gr.eccentricity(), {0: 4, 1: 3, 2: 2, 3: 3, 4: 4, 10: 1, 11: 1, 12: 1, 20: 0},
+                         "Eccentricities are measured within each component")
+        self.assertEqual(gr.diameter(), 4, "The path has the largest diameter")
+        self.assertEqual(gr.diameter(per_component=True), [4, 1, 0], "Diameters of the three components")
+        self.assertEqual(gr.radius(), 2, "The radius of the path is 2")
+        self.assertEqual(gr.radius(exact=False, per_component=True), [2, 1, 0], "The sweep finds the centers")
+
+        # Compare with one breadth-first search per node on a random graph larger than one batch of sources
+        rng = random.Random(11)
+        gr = glib.Graph()
+        for k in range(150):
+            gr.add_node(k)
+        for k in range(1, 150):
+            gr.add_link(k, rng.randrange(k) if k != 100 else 150)
+        for _ in range(40):
+            gr.add_link(rng.randrange(150), rng.randrange(150))
+        expected = {nd: gr.eccentricity(nd) for nd in gr.get_nodes()}
+        self.assertEqual(gr.eccentricity(), expected, "Batched search should match single searches")
+        self.assertEqual(gr.freeze().eccentricity(processes=2, chunk_size=64), expected,
+                         "Parallel batched search should match single searches")
+        sizes = [len(members) for members in gr.connected_components()]
+        diameters = gr.diameter(per_component=True)
+        for members, diameter in zip(gr.connected_components(), diameters):
+            self.assertEqual(diameter, max(expected[nd] for nd in members), "iFUB should find the exact diameter")
+        lower, upper = gr.diameter_bounds(max_bfs=0)
+        self.assertTrue(lower <= max(diameters) <= upper, "Double sweep bounds should contain the diameter")
+        self.assertEqual(sum(sizes), 150, "Every node should be in a component")
+
+    def test_streaming_exporters(self):
+        gr = self.gr_ww_5
+        expected = "".join("node: {},  near: {},  payload: {}\n".format(nd, gr.get_links(nd), gr.get_payload(nd))
+                           for nd in gr.get_nodes())
+        self.assertEqual(str(gr), expected, "A small graph should be shown in full")
+
+        page = io.StringIO()
+        self.assertEqual(gr.write_text(page, start=1, limit=2), 2, "The page should have two nodes")
+        self.assertEqual(page.getvalue(), "".join(expected.splitlines(True)[1:3]), "The page should start at node 1")
+
+        big = glib.Graph()
+        for k in range(glib.STR_NODE_LIMIT + 10):
+            big.add_node(k)
+        big.add_link(0, 1)
+        lines = str(big).splitlines()
+        self.assertEqual(lines[0], "Graph with {} nodes and 1 links".format(glib.STR_NODE_LIMIT + 10),
+                         "A big graph should start with a summary")
+        self.assertEqual(len(lines), glib.STR_NODE_LIMIT + 2, "A big graph should show a limited number of nodes")
+        self.assertEqual(lines[-1], "... 10 more nodes", "A big graph should report the nodes not shown")
+
+        dot = io.StringIO()
+        gr.write_dot(dot)
+        text = dot.getvalue()
+        self.assertTrue(text.startswith('graph "G" {'), "DOT output should define an undirected graph")
+        self.assertEqual(text.count(" -- "), len(list(gr.iter_links())), "DOT output should list each link once")
+
+        mixed = glib.Graph()
+        mixed.add_nodes_from_list([1, 'a', 2, 'b'])
+        mixed.add_links_from_list([(1, 'a'), ('a', 2), (2, 1), ('b', 'b')])
+        self.assertEqual(len(list(mixed.iter_links())), 4, "Links between IDs of different types should be listed once")
+
+        graphml = io.StringIO()
+        gr.add_payload(0, {'name': 'a < b'})
+        gr.write_graphml(graphml)
+        root = ElementTree.fromstring(graphml.getvalue())
+        namespace = "{http://graphml.graphdrawing.org/xmlns}"
+        nodes = root.findall("{0}graph/{0}node".format(namespace))
+        edges = root.findall("{0}graph/{0}edge".format(namespace))
+        self.assertEqual(len(nodes), gr.size(), "GraphML output should list every node")
+        self.assertEqual(len(edges), len(list(gr.iter_links())), "GraphML output should list each link once")
+        payload = [nd for nd in nodes if nd.get("id") == "0"][0].find(namespace + "data").text
+        self.assertEqual(json.loads(payload), {'name': 'a < b'}, "Payloads should be escaped json text")
+
+    def test_weight_sorted_neighbors(self):
+        gr = glib.Graph(has_weights=True)
+        for k in range(6):
+            gr.add_node(k)
+        gr.add_links_from_list([(0, 1, 0.5), (0, 2, 3.0), (0, 3, 2.0), (0, 4, 1.0), (2, 5, 0.1), (3, 5, 4.0)])
+
+        self.assertEqual(gr.top_k_neighbors(0, 2), [(0, 2, 3.0), (0, 3, 2.0)], "Strongest links of node 0")
+        self.assertEqual(len(gr.top_k_neighbors(0, 10)), 4, "Node 0 only has 4 links")
+        self.assertEqual(gr.top_k_neighbors(9, 2), None, "A missing node has no links")
+        self.assertEqual(gr.neighbors_with_weight_between(0, 1.0, 2.0), [(0, 4, 1.0), (0, 3, 2.0)],
+                         "Links with weights between 1 and 2, in increasing order")
+        self.assertEqual(gr.strongest_first_traverse(0), [0, 2, 5, 3, 4, 1],
+                         "The traversal should follow the strongest link and backtrack")
+        self.assertEqual(gr.strongest_first_traverse(0, restrict_to={0, 3, 4}), [0, 3, 4],
+                         "The traversal should only move to allowed nodes")
+
+        gr.add_link(0, 5, 9.0)
+        gr.remove_link_between_nodes(0, 2)
+        self.assertEqual(gr.top_k_neighbors(0, 2), [(0, 5, 9.0), (0, 3, 2.0)], "Sorted links should follow changes")
+        gr.remove_node(3)
+        self.assertEqual(gr.neighbors_with_weight_between(5, 0.0, 10.0), [(5, 2, 0.1), (5, 0, 9.0)],
+                         "Sorted links should follow node removals")
+
+        self.assertEqual(len(self.gr_nw_5.top_k_neighbors(0, 1)), 1, "Graphs without weights should also work")
+
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            sgr = glib.Graph(has_weights=True, storage=glib.SQLiteStorage(os.path.join(tmp_dir, "graph.db"), 2))
+            sgr.add_nodes_from_list([k for k in range(10)])
+            sgr.add_links_from_list([(k, k + 1, float(k)) for k in range(9)])
+            self.assertEqual(sgr.strongest_first_traverse(0), list(range(10)), "The traversal should follow the path")
+            self.assertLessEqual(sgr.storage().cached_nodes(), 2, "The storage cache should stay bounded")
+            self.assertEqual(sgr.top_k_neighbors(5, 1), [(5, 6, 5.0)], "Sorted links should be rebuilt after eviction")
+            sgr.close()
+        finally:
+            shutil.rmtree(tmp_dir)
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file